@@ -0,0 +1,291 @@
+import itertools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from configuration import create_configuration
+from constants import ALPHABET
+from enigma_search import get_plugboard_table, get_reflector_table, get_rotor_spec, to_indices
+from ngrams import index_of_coincidence
+from scrambler import get_effective_reflector, get_message_permutations
+from stepping import get_positions_after_key_presses
+
+# Scores a batch can be evaluated with: index of coincidence of the decrypt, or number of letters matching a crib
+BATCH_SCORES = ['ioc', 'crib']
+
+# Default memory budget of the arrays of one block of configurations, in bytes
+DEFAULT_MAX_BYTES = 64 << 20
+
+# Number of (configurations x letters) int64 arrays alive at once while a block is decrypted
+BLOCK_ARRAYS = 8
+
+# Stores a table of values (one row per configuration) as an uint8 array, or as a list of tuples without NumPy
+def to_rows(values):
+    if np is not None:
+        return np.array(values, dtype=np.uint8)
+
+    return [tuple(row) if isinstance(row, (list, tuple)) else row for row in values]
+
+"""
+    Key configurations held as arrays, one row per configuration, so they can be decrypted together
+    Rotors and reflectors are indices into label lists, which keeps every row a few bytes long.
+
+    :param rotor_labels: Labels the rotor indices refer to (E.g. ['I', 'II', 'III', 'IV', 'V'])
+    :param reflector_labels: Labels the reflector indices refer to (E.g. ['A', 'B', 'C'])
+    :param rotors: K x R rotor indices, from left to right
+    :param reflectors: K reflector indices
+    :param ring_settings: K x R ring settings (1 to 26), from left to right
+    :param positions: K x R zero based start positions, from left to right
+    :param plugboards: K x 26 plugboard permutations (None for no plugboards)
+"""
+class ConfigurationBatch:
+    def __init__(self, rotor_labels, reflector_labels, rotors, reflectors, ring_settings, positions, plugboards = None):
+        self.rotor_labels = list(rotor_labels)
+        self.reflector_labels = list(reflector_labels)
+        self.rotors = to_rows(rotors)
+        self.reflectors = to_rows(reflectors)
+        self.ring_settings = to_rows(ring_settings)
+        self.positions = to_rows(positions)
+        self.plugboards = None if plugboards is None else to_rows(plugboards)
+
+        self.length = len(self.rotors)
+        if self.length == 0:
+            raise ValueError('A batch needs at least one configuration')
+
+        self.rotor_count = len(self.rotors[0])
+        if self.rotor_count < 3:
+            raise ValueError('A batch needs the three stepping rotors')
+
+        shapes = [(self.ring_settings, self.rotor_count), (self.positions, self.rotor_count)]
+        if self.plugboards is not None:
+            shapes.append((self.plugboards, 26))
+        if len(self.reflectors) != self.length or any(len(table) != self.length or len(table[0]) != width for table, width in shapes):
+            raise ValueError('Every configuration needs a reflector, a ring setting and a position per rotor, and a 26 letter plugboard')
+
+        # Zero based notches by rotor index
+        notches = [get_rotor_spec(label)[2] for label in self.rotor_labels]
+
+        if np is None:
+            stepping_rotors = set([index for row in self.rotors for index in row[-3:]])
+        else:
+            stepping_rotors = np.unique(self.rotors[:, -3:]).tolist()
+        if any(notches[index] is None for index in stepping_rotors):
+            raise ValueError('The three rightmost rotors of a batch must have notches')
+
+        if np is not None:
+            self.notches = np.array([-1 if notch is None else notch for notch in notches], dtype=np.int64)
+            self.forward_tables = np.array([[list(table) for table in get_rotor_spec(label)[0]] for label in self.rotor_labels], dtype=np.uint8)
+            self.reverse_tables = np.array([[list(table) for table in get_rotor_spec(label)[1]] for label in self.rotor_labels], dtype=np.uint8)
+            self.reflector_tables = np.array([list(get_reflector_table(label)) for label in self.reflector_labels], dtype=np.uint8)
+
+            if self.plugboards is not None:
+                rows = np.arange(self.length).reshape(-1, 1)
+                if not (self.plugboards[rows, self.plugboards] == np.arange(26)).all():
+                    raise ValueError('A plugboard must be a permutation of 26 indices which is its own inverse')
+
+    def __len__(self):
+        return self.length
+
+    # Builds a batch from a list of configuration.KeyConfiguration
+    @staticmethod
+    def from_configurations(configurations):
+        configurations = [create_configuration(*configuration) for configuration in configurations]
+        rotor_labels = sorted(set([label for configuration in configurations for label in configuration.rotors]))
+        reflector_labels = sorted(set([configuration.reflector for configuration in configurations]))
+
+        plugboards = None
+        if any(len(configuration.plug_leads) for configuration in configurations):
+            plugboards = [get_plugboard_table(configuration.plug_leads) for configuration in configurations]
+
+        return ConfigurationBatch(
+            rotor_labels,
+            reflector_labels,
+            [[rotor_labels.index(label) for label in configuration.rotors] for configuration in configurations],
+            [reflector_labels.index(configuration.reflector) for configuration in configurations],
+            [configuration.ring_settings for configuration in configurations],
+            [to_indices(configuration.positions) for configuration in configurations],
+            plugboards,
+        )
+
+    # Builds a batch of every configuration of an enigma_search.SearchSpace, in the order search_crib goes through them
+    @staticmethod
+    def from_search_space(space):
+        rotor_labels = sorted(set([label for order in space.rotor_orders for label in order]))
+        reflector_labels = sorted(set(space.reflectors))
+        tasks = list(space.iter_tasks())
+        positions = list(itertools.product(*[to_indices(choices) for choices in space.positions]))
+
+        plugboards = None
+        if any(len(plug_leads) for plug_leads in space.plug_leads):
+            plugboards = [get_plugboard_table(plug_leads) for (_, _, _, plug_leads) in tasks]
+
+        # Each task's values are repeated over the start positions, which are tiled over the tasks
+        if np is not None:
+            def repeat(values):
+                return np.repeat(to_rows(values), len(positions), axis=0)
+
+            return ConfigurationBatch(
+                rotor_labels,
+                reflector_labels,
+                repeat([[rotor_labels.index(label) for label in rotors] for (rotors, _, _, _) in tasks]),
+                repeat([reflector_labels.index(reflector) for (_, reflector, _, _) in tasks]),
+                repeat([ring_settings for (_, _, ring_settings, _) in tasks]),
+                np.tile(to_rows(positions), (len(tasks), 1)),
+                None if plugboards is None else repeat(plugboards),
+            )
+
+        rows = [(task, task_positions) for task in range(len(tasks)) for task_positions in positions]
+
+        return ConfigurationBatch(
+            rotor_labels,
+            reflector_labels,
+            [[rotor_labels.index(label) for label in tasks[task][0]] for task, _ in rows],
+            [reflector_labels.index(tasks[task][1]) for task, _ in rows],
+            [tasks[task][2] for task, _ in rows],
+            [task_positions for _, task_positions in rows],
+            None if plugboards is None else [plugboards[task] for task, _ in rows],
+        )
+
+    # Key configuration of a row of the batch
+    def get_configuration(self, row):
+        plug_leads = ()
+        if self.plugboards is not None:
+            table = self.plugboards[row]
+            plug_leads = [ALPHABET[index] + ALPHABET[table[index]] for index in range(26) if index < table[index]]
+
+        return create_configuration(
+            [self.rotor_labels[index] for index in self.rotors[row]],
+            self.reflector_labels[self.reflectors[row]],
+            [int(ring_setting) for ring_setting in self.ring_settings[row]],
+            [ALPHABET[position] for position in self.positions[row]],
+            plug_leads,
+        )
+
+# Reflectors of a block of rows, each wrapped in its static rotors (left of the three stepping ones), as a (k x 26) array
+# Each distinct reflector, static rotors and static offsets of the block is folded once, by scrambler.get_effective_reflector
+def get_effective_reflectors(batch, rows):
+    static_count = batch.rotor_count - 3
+    reflectors = batch.reflectors[rows]
+    if static_count == 0:
+        return batch.reflector_tables[reflectors]
+
+    static_rotors = batch.rotors[rows, :static_count]
+    static_offsets = (batch.positions[rows, :static_count].astype(np.int64) + 1 - batch.ring_settings[rows, :static_count]) % 26
+    keys = np.concatenate([reflectors.reshape(-1, 1), static_rotors, static_offsets], axis=1).astype(np.int64)
+    (unique_keys, inverse) = np.unique(keys, axis=0, return_inverse=True)
+
+    effective_reflectors = np.array([
+        list(get_effective_reflector(batch.reflector_labels[key[0]], [batch.rotor_labels[index] for index in key[1:static_count + 1]], key[static_count + 1:]))
+        for key in unique_keys.tolist()
+    ], dtype=np.uint8)
+
+    return effective_reflectors[inverse.reshape(-1)]
+
+"""
+    Decrypts a block of rows of a batch together, as (k x n) array lookups
+    Each stepping rotor's positions at every key press come from the closed form of the stepping,
+    broadcast over the rows, and the static rotors are folded into per row effective reflectors.
+
+    :param rows: Slice of the rows of the block
+    :param ciphertext: Array of n zero based letter indices
+    :param first_key_press: Key press of the first letter (1 for the start of a message)
+    :returns: (k x n) array of the zero based plaintext letters
+"""
+def decrypt_block(batch, rows, ciphertext, first_key_press = 1):
+    key_presses = np.arange(first_key_press, first_key_press + len(ciphertext), dtype=np.int64).reshape(1, -1)
+    block_rows = np.arange(len(batch.rotors[rows])).reshape(-1, 1)
+
+    # Slots order (rightmost rotor first) for the three stepping rotors
+    columns = range(batch.rotor_count - 1, batch.rotor_count - 4, -1)
+    rotors = [batch.rotors[rows, column].reshape(-1, 1) for column in columns]
+    start_positions = [batch.positions[rows, column].astype(np.int64).reshape(-1, 1) for column in columns]
+    notches = [batch.notches[slot_rotors] for slot_rotors in rotors]
+    positions = get_positions_after_key_presses(start_positions, notches, key_presses)
+    offsets = [(slot_positions + 1 - batch.ring_settings[rows, column].reshape(-1, 1)) % 26 for slot_positions, column in zip(positions, columns)]
+
+    indices = ciphertext.reshape(1, -1)
+    if batch.plugboards is not None:
+        indices = batch.plugboards[rows][block_rows, indices]
+
+    for slot_rotors, slot_offsets in zip(rotors, offsets):
+        indices = batch.forward_tables[slot_rotors, slot_offsets, indices]
+
+    indices = get_effective_reflectors(batch, rows)[block_rows, indices]
+
+    for slot_rotors, slot_offsets in zip(reversed(rotors), reversed(offsets)):
+        indices = batch.reverse_tables[slot_rotors, slot_offsets, indices]
+
+    if batch.plugboards is not None:
+        indices = batch.plugboards[rows][block_rows, indices]
+
+    return indices
+
+# Scores the (k x n) plaintexts of a block
+def score_block(plaintext, score, crib):
+    if score == 'crib':
+        return (plaintext == crib.reshape(1, -1)).sum(axis=1)
+
+    (rows, length) = plaintext.shape
+    counts = np.bincount((np.arange(rows).reshape(-1, 1) * 26 + plaintext).ravel(), minlength=rows * 26).reshape(-1, 26)
+
+    return (counts * (counts - 1)).sum(axis=1) / (length * (length - 1))
+
+# Scores the rows of a batch one at a time, for when NumPy is not installed
+def score_rows(batch, ciphertext, score, crib, first_key_press):
+    scores = []
+    for row in range(len(batch)):
+        configuration = batch.get_configuration(row)
+        plugboard = get_plugboard_table(configuration.plug_leads)
+        permutations = get_message_permutations(configuration.rotors, configuration.reflector, configuration.ring_settings, configuration.positions, len(ciphertext), first_key_press - 1)
+        plaintext = [plugboard[permutation[plugboard[index]]] for permutation, index in zip(permutations, ciphertext)]
+
+        if score == 'crib':
+            scores.append(sum([letter == expected for letter, expected in zip(plaintext, crib)]))
+        else:
+            scores.append(index_of_coincidence(plaintext))
+
+    return scores
+
+"""
+    Scores every configuration of a batch against one ciphertext
+    With NumPy, blocks of configurations are decrypted in lockstep as (k x n) arrays, k being chosen
+    so a block's arrays fit in max_bytes; there is no Python work per configuration. Without NumPy
+    the configurations are decrypted one at a time.
+
+    :param batch: ConfigurationBatch
+    :param score: 'ioc' for the index of coincidence of the whole decrypt, 'crib' for the number of
+                  crib letters the decrypt matches (only the crib's letters are decrypted)
+    :param max_bytes: Memory budget of the arrays of one block
+    :returns: Array of K scores (a list without NumPy), in the batch's order
+"""
+def evaluate_batch(batch, ciphertext, score = 'ioc', crib = None, crib_offset = 0, max_bytes = DEFAULT_MAX_BYTES):
+    if score not in BATCH_SCORES:
+        raise ValueError(f'The score must be one of {BATCH_SCORES}')
+
+    first_key_press = 1
+    if score == 'crib':
+        if not crib or crib_offset < 0 or crib_offset + len(crib) > len(ciphertext):
+            raise ValueError('The crib must be placed within the ciphertext')
+        ciphertext = ciphertext[crib_offset:crib_offset + len(crib)]
+        first_key_press = crib_offset + 1
+    elif len(ciphertext) < 2:
+        raise ValueError('The ciphertext needs at least 2 letters')
+
+    ciphertext = to_indices(ciphertext)
+    crib = None if crib is None else to_indices(crib)
+
+    if np is None:
+        return score_rows(batch, ciphertext, score, crib, first_key_press)
+
+    ciphertext = np.array(ciphertext, dtype=np.intp)
+    crib = None if crib is None else np.array(crib, dtype=np.uint8)
+    block_size = max(1, max_bytes // (len(ciphertext) * 8 * BLOCK_ARRAYS))
+
+    scores = np.zeros(len(batch), dtype=np.int64 if score == 'crib' else np.float64)
+    for start in range(0, len(batch), block_size):
+        rows = slice(start, min(start + block_size, len(batch)))
+        scores[rows] = score_block(decrypt_block(batch, rows, ciphertext, first_key_press), score, crib)
+
+    return scores
@@ -0,0 +1,207 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import timeit
+
+# The benchmarks import the simulation modules from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import ALPHABET, CurrentFlowDirections
+from enigma import EnigmaMachine
+from rotors import rotor_from_name
+
+# Fraction a benchmark may slow down by, relative to the baseline, before it counts as a regression
+DEFAULT_THRESHOLD = 0.25
+
+# Text sizes encode_text is measured at
+ENCODE_TEXT_SIZES = [100, 10000, 100000]
+
+MESSAGE_KEY = {
+    'rotors': ['I', 'II', 'III'],
+    'reflector': 'B',
+    'positions': ['A', 'D', 'U'],
+    'ring_settings': [1, 5, 20],
+    'plug_leads': ['AZ', 'BY', 'CX', 'DW', 'EV'],
+}
+
+CRIB = 'WETTERVORHERSAGE'
+
+# Builds a machine for the benchmarked message key
+def create_machine(message_key = MESSAGE_KEY):
+    rotors = []
+    for label, position, ring_setting in zip(message_key['rotors'], message_key['positions'], message_key['ring_settings']):
+        rotor = rotor_from_name(label)
+        rotor.set_initial_position(position)
+        rotor.set_ring_setting(ring_setting)
+        rotors.append(rotor)
+
+    return EnigmaMachine(rotors, rotor_from_name(message_key['reflector']), message_key['plug_leads'])
+
+# Deterministic A to Z text of a given size
+def create_text(size):
+    return ''.join([ALPHABET[(i * 7 + i // 26) % 26] for i in range(size)])
+
+def bench_rotor_handle_key_encoding():
+    rotor = rotor_from_name('I')
+
+    def run():
+        for character in ALPHABET:
+            rotor.handle_key_encoding(character, CurrentFlowDirections.FORWARD)
+            rotor.handle_key_encoding(character, CurrentFlowDirections.REVERSE)
+
+    return run, 2 * len(ALPHABET)
+
+def bench_handle_key_press():
+    machine = create_machine()
+
+    def run():
+        for character in ALPHABET:
+            machine.handle_key_press(character)
+
+    return run, len(ALPHABET)
+
+def bench_encode_text(size):
+    machine = create_machine()
+    message_key = machine.snapshot()
+    text = create_text(size)
+
+    def run():
+        machine.restore(message_key)
+        machine.encode_text(text)
+
+    return run, size
+
+def bench_machine_construction():
+    def run():
+        create_machine()
+
+    return run, 1
+
+# Finds the start positions of the two rightmost rotors from a crib at the start of the message
+def bench_key_search():
+    machine = create_machine()
+    message_key = machine.snapshot()
+    ciphertext = machine.encode_text(CRIB)
+
+    # Each candidate's state is set up once through the public setters; the search only restores them
+    machine.restore(message_key)
+    candidates = []
+    for middle, right in itertools.product(range(1, 27), repeat=2):
+        machine.set_single_initial_position(2, middle)
+        machine.set_single_initial_position(1, right)
+        candidates.append(((middle, right), machine.snapshot()))
+
+    def run():
+        hits = []
+        for candidate, state in candidates:
+            machine.restore(state)
+            if machine.encode_text(ciphertext) == CRIB:
+                hits.append(candidate)
+
+        assert len(hits) > 0
+
+    return run, 26 * 26
+
+# Name and setup of every benchmark; setups return the timed callable and the operations per call
+def get_benchmarks():
+    benchmarks = [
+        ('rotor_handle_key_encoding', bench_rotor_handle_key_encoding),
+        ('machine_handle_key_press', bench_handle_key_press),
+    ]
+    for size in ENCODE_TEXT_SIZES:
+        benchmarks.append((f'encode_text_{size}', lambda size=size: bench_encode_text(size)))
+    benchmarks += [
+        ('machine_construction', bench_machine_construction),
+        ('key_search', bench_key_search),
+    ]
+
+    return benchmarks
+
+# Times a callable, keeping the best of several repeats to reduce noise
+def measure(run, operations, repeat, min_time):
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    return {
+        'seconds_per_call': best,
+        'operations_per_call': operations,
+        'seconds_per_operation': best / operations,
+    }
+
+def run_benchmarks(names = None, repeat = 5, min_time = 0.2):
+    results = {}
+    for name, setup in get_benchmarks():
+        if names and name not in names:
+            continue
+
+        run, operations = setup()
+        results[name] = measure(run, operations, repeat, min_time)
+        print(f'{name:<30} {results[name]["seconds_per_call"] * 1e6:>14.2f} us/call')
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+# Lists the benchmarks which are slower than the baseline by more than the threshold
+def find_regressions(report, baseline, threshold):
+    regressions = []
+    for name, result in report['results'].items():
+        if name not in baseline['results']:
+            continue
+
+        baseline_seconds = baseline['results'][name]['seconds_per_call']
+        ratio = result['seconds_per_call'] / baseline_seconds
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+
+    return regressions
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description='Benchmarks for the hot paths of the Enigma simulation')
+    parser.add_argument('names', nargs='*', help='Benchmarks to run (all by default)')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against the results JSON in this file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Allowed slow down relative to the baseline (default {DEFAULT_THRESHOLD})')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats per benchmark; the best is kept')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Seconds each repeat should roughly take')
+    parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+
+    return parser.parse_args(args)
+
+def main(args):
+    options = parse_args(args)
+
+    if options.list:
+        for name, _ in get_benchmarks():
+            print(name)
+        return os.EX_OK
+
+    report = run_benchmarks(options.names, options.repeat, options.min_time)
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+
+        regressions = find_regressions(report, baseline, options.threshold)
+        for name, ratio in regressions:
+            print(f'Regression: {name} is {ratio:.2f}x the baseline')
+
+        if regressions:
+            return 1
+
+    return os.EX_OK
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,153 @@
+import itertools
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from constants import ALPHABET
+from enigma_search import REFLECTOR_LABELS, ROTOR_LABELS, to_indices
+from scrambler import PositionSweep, get_offsets_index
+
+# Machine setting at which a plugboard hypothesis survived the menu
+#   plug_leads: Deduced leads (E.g. ('AB', 'CD')), self_steckered: Letters deduced to have no lead
+BombeStop = namedtuple('BombeStop', ['rotors', 'reflector', 'ring_settings', 'positions', 'plug_leads', 'self_steckered'])
+
+"""
+    Letter pair graph of a crib aligned against the ciphertext
+    Each edge (plaintext letter, ciphertext letter, step) says the scrambler at that step maps
+    the plugboard partner of one letter to the plugboard partner of the other. Only the connected
+    component with the most edges is kept; its loops are what contradictions come from.
+
+    :param crib_offset: Position of the crib in the ciphertext
+"""
+class Menu:
+    def __init__(self, ciphertext, crib, crib_offset = 0):
+        if len(crib) == 0 or crib_offset < 0 or crib_offset + len(crib) > len(ciphertext):
+            raise ValueError('The crib must be placed within the ciphertext')
+
+        plaintext_indices = to_indices(crib)
+        ciphertext_indices = to_indices(ciphertext[crib_offset:crib_offset + len(crib)])
+
+        edges = []
+        for step, (plaintext_index, ciphertext_index) in enumerate(zip(plaintext_indices, ciphertext_indices)):
+            # A letter never encrypts to itself
+            if plaintext_index == ciphertext_index:
+                raise ValueError(f'The crib cannot be at offset {crib_offset}; {crib[step]} would encrypt to itself')
+            edges.append((plaintext_index, ciphertext_index, step))
+
+        self.crib_offset = crib_offset
+        self.edges = self.get_largest_component(edges)
+        self.letters = sorted(set([edge[0] for edge in self.edges] + [edge[1] for edge in self.edges]))
+        self.loops = len(self.edges) - len(self.letters) + 1
+
+        # Steps used by the menu and, per letter, the (other letter, index in steps) pairs it is connected to
+        self.steps = sorted(set([edge[2] for edge in self.edges]))
+        self.adjacency = [[] for _ in range(26)]
+        for (first, second, step) in self.edges:
+            step_index = self.steps.index(step)
+            self.adjacency[first].append((second, step_index))
+            self.adjacency[second].append((first, step_index))
+
+        # The hypotheses are made on the most connected letter
+        self.test_letter = max(self.letters, key=lambda letter: len(self.adjacency[letter]))
+
+    @staticmethod
+    def get_largest_component(edges):
+        components = []
+        for edge in edges:
+            connected = [component for component in components if any(set(edge[:2]) & set(other[:2]) for other in component)]
+            merged = [edge] + [other for component in connected for other in component]
+            components = [component for component in components if component not in connected] + [merged]
+
+        return sorted(max(components, key=len), key=lambda edge: edge[2])
+
+# Propagates the hypothesis that the test letter is steckered to a value through the menu
+# The permutations are the scrambler's at each of the menu's steps
+# Returns the deduced steckers (-1 for unknown) or None when the hypothesis contradicts itself
+def propagate(menu, permutations, value):
+    steckers = [-1] * 26
+    assertions = [(menu.test_letter, value)]
+    adjacency = menu.adjacency
+
+    while assertions:
+        (letter, value) = assertions.pop()
+        current = steckers[letter]
+        if current == value:
+            continue
+        if current != -1:
+            return None
+
+        steckers[letter] = value
+
+        # Steckering is symmetric (the bombe's diagonal board)
+        assertions.append((value, letter))
+        for (other, step_index) in adjacency[letter]:
+            assertions.append((other, permutations[step_index][value]))
+
+    return steckers
+
+# Runs the menu against every start position of one rotor order, reflector and static rotor positions
+def run_task(task, menu, ring_settings):
+    (rotors, reflector, static_positions) = task
+
+    # Every start position is a window into the keystream of one stepping cycle
+    static_offsets = [(position - ring_setting + 1) % 26 for position, ring_setting in zip(static_positions, ring_settings)]
+    sweep = PositionSweep(rotors, reflector, ring_settings, menu.crib_offset + menu.steps[-1] + 1, static_offsets)
+    permutations = sweep.permutations
+    steps = [menu.crib_offset + step for step in menu.steps]
+
+    stops = []
+    for start_positions in itertools.product(range(26), repeat=3):
+        window_start = sweep.window_starts[get_offsets_index(*start_positions)]
+        step_permutations = [permutations[window_start + step] for step in steps]
+
+        for value in range(26):
+            steckers = propagate(menu, step_permutations, value)
+            if steckers is None:
+                continue
+
+            positions = [ALPHABET[position] for position in static_positions] + [ALPHABET[position] for position in start_positions[::-1]]
+            stops.append(BombeStop(
+                tuple(rotors),
+                reflector,
+                tuple(ring_settings),
+                tuple(positions),
+                tuple([ALPHABET[letter] + ALPHABET[partner] for letter, partner in enumerate(steckers) if -1 < letter < partner]),
+                tuple([ALPHABET[letter] for letter, partner in enumerate(steckers) if letter == partner]),
+            ))
+
+    return stops
+
+"""
+    Runs a crib menu against every rotor order and start position, pruning plugboard hypotheses by contradiction
+    :param rotor_orders: Rotor labels from left to right; all orders of three of I to V by default
+    :param reflectors: Reflector labels; A, B and C by default
+    :param ring_settings: Ring settings from left to right; all 1 by default
+    :param static_positions: Candidate positions of every rotor left of the three stepping ones (E.g. [ALPHABET])
+    :param workers: Number of worker processes (defaults to the number of CPUs)
+    :returns: List of BombeStop
+"""
+def run_bombe(ciphertext, crib, crib_offset = 0, rotor_orders = None, reflectors = None, ring_settings = None, static_positions = (), workers = None):
+    menu = Menu(ciphertext, crib, crib_offset)
+
+    rotor_orders = [tuple(order) for order in (itertools.permutations(ROTOR_LABELS, 3) if rotor_orders is None else rotor_orders)]
+    reflectors = REFLECTOR_LABELS if reflectors is None else reflectors
+    static_positions = list(itertools.product(*[to_indices(choices) for choices in static_positions]))
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    for order in rotor_orders:
+        if len(order) != len(rotor_orders[0]) or len(order) - 3 != len(static_positions[0]):
+            raise ValueError('Every rotor order needs the same number of rotors, with positions for the static ones')
+        if ring_settings is not None and len(ring_settings) != len(order):
+            raise ValueError('Every rotor needs a ring setting')
+
+    ring_settings = tuple([1] * len(rotor_orders[0]) if ring_settings is None else ring_settings)
+    tasks = list(itertools.product(rotor_orders, reflectors, static_positions))
+
+    if workers == 1:
+        results = [run_task(task, menu, ring_settings) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_task, tasks, itertools.repeat(menu), itertools.repeat(ring_settings)))
+
+    return [stop for stops in results for stop in stops]
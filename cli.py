@@ -1,10 +1,15 @@
 import os
+import pathlib
 import sys
 
+from constants import ALPHABET
 from enigma import *
 from rotors import *
 
-AVAILABLE_OPTIONS = ['rt', 'rf', 'rtp,' 'rtr,' 'pl', '-h']
+AVAILABLE_OPTIONS = ['rt', 'rf', 'rtp', 'rtr', 'pl', 'in', 'wk', '-h']
+
+# Input path value which reads the texts from stdin
+STANDARD_INPUT = '-'
 
 
 class EnigmaCliMachine():
@@ -16,14 +21,24 @@ class EnigmaCliMachine():
         self.plug_lead_mappings = []
         self.reflector_cls = ARotor
         self.machine = ARotor
+        self.message_key = None
+        self.input_path = None
+        self.workers = None
 
+    # Returns False, after explaining why, when the settings do not make a valid machine (E.g. a letter on two plug leads)
     def create_machine(self):
-        self.machine = EnigmaMachine(self.rotors, self.reflector, self.plug_lead_mappings)
+        try:
+            self.machine = EnigmaMachine(self.rotors, self.reflector, self.plug_lead_mappings)
+        except ValueError as error:
+            print(f'Please enter valid settings: {error}')
+            return False
 
+        self.message_key = self.machine.snapshot()
+        return True
+
+    # Returns the machine to the message key
     def reset_machine(self):
-        self.set_rotors()
-        self.set_reflector()
-        self.machine.reset_state(self.rotors, self.reflector, self.plug_lead_mappings)
+        self.machine.restore(self.message_key)
 
     def accept_texts(self):
         while True:
@@ -38,6 +53,10 @@ class EnigmaCliMachine():
 
                 print(f'The encoding is: {encoding}')
 
+                self.reset_machine()
+            except ValueError as error:
+                # A text which cannot be encoded does not end the session
+                print(f'The text could not be encoded: {error}')
                 self.reset_machine()
             except KeyboardInterrupt:
                 print('You Interrupted')
@@ -46,6 +65,31 @@ class EnigmaCliMachine():
                 print('An error occured; please check that you passed the right settings')
                 sys.exit(os.EX_USAGE)
 
+    def encode_input_file(self):
+        try:
+            if self.input_path == STANDARD_INPUT:
+                self.encode_standard_input()
+                return
+
+            # The encoding keeps the file's own line breaks and is written out chunk by chunk
+            self.machine.encode_parallel(self.input_path, workers=self.workers, upper_case=True, dst=sys.stdout)
+        except KeyboardInterrupt:
+            print('You Interrupted')
+            sys.exit(os.EX_OK)
+        except ValueError as error:
+            print(f'The input could not be encoded: {error}')
+            sys.exit(os.EX_DATAERR)
+        except Exception:
+            print('An error occured; please check that you passed the right settings')
+            sys.exit(os.EX_USAGE)
+
+    # Pipes stdin to stdout line by line; the lines form a single message and keep their line breaks
+    def encode_standard_input(self):
+        lines = (line.upper() for line in sys.stdin)
+        for encoding in self.machine.encode_stream(lines):
+            sys.stdout.write(encoding)
+            sys.stdout.flush()
+
     def print_help(self):
         print("""
 Welcome to the Enigma CLI client!
@@ -56,10 +100,14 @@ rf   : Reflector (A, B, C)
 rtp  : Rotor Starting Positions (A-Z; E.g. "A B E")
 rtr  : Ring Settings (1-26; E.g. "1 14 26")
 pl   : Plug Leads (E.g. "AB CD ES")
+in   : Input file to encode instead of prompting for texts ("-" streams stdin to stdout)
+wk   : Number of worker processes for encoding the input file (Defaults to the number of CPUs)
 -h    : Show help
 
 For example:
 > python3 cli.py rt="I II III" rf="C" rtr="1 14 26" rtp="A B E" pl="AC DE LH"
+> python3 cli.py rt="I II III" rf="C" in="archive.txt" wk="8"
+> cat messages.txt | python3 cli.py rt="I II III" rf="C" in="-"
             """)
 
     def parse_args(self, args):
@@ -79,7 +127,6 @@ For example:
         return probably_valid_args
 
     def is_rotor_arg_value_valid(self, value):
-        print(value)
         val_len = len(value)
         if val_len != 3 and val_len != 4:
             print('Please enter 3 or 4 values')
@@ -93,8 +140,34 @@ For example:
 
         return True
 
+    def is_rotor_positions_valid(self, value):
+        val_len = len(value)
+        if val_len != 3 and val_len != 4:
+            print('Please enter 3 or 4 values')
+            return False
+
+        for i in value:
+            if len(i) != 1 or not i in ALPHABET:
+                print('Please enter rotor positions between A and Z')
+                return False
+
+        return True
+
+    def is_ring_settings_valid(self, value):
+        val_len = len(value)
+        if val_len != 3 and val_len != 4:
+            print('Please enter 3 or 4 values')
+            return False
+
+        for i in value:
+            if not i.isdigit() or not 1 <= int(i) <= 26:
+                print('Please enter ring settings between 1 and 26')
+                return False
+
+        return True
+
     def is_reflector_valid(self, value):
-        valid_values = ['A', 'B', 'C']
+        valid_values = ['A', 'B', 'C', 'BThin', 'CThin']
         is_valid = value in valid_values
 
         if not is_valid:
@@ -104,6 +177,20 @@ For example:
     def is_plug_lead_mappings_valid(self, value):
         return len(value) <= 10
 
+    def is_input_path_valid(self, value):
+        is_valid = value == STANDARD_INPUT or os.path.isfile(value)
+
+        if not is_valid:
+            print(f'The input file {value} does not exist')
+        return is_valid
+
+    def is_workers_valid(self, value):
+        is_valid = value.isdigit() and int(value) > 0
+
+        if not is_valid:
+            print('Please enter a positive number of workers')
+        return is_valid
+
     def parse_arg(self, arg, value):
 
         if arg == 'rt':
@@ -117,19 +204,27 @@ For example:
             self.set_reflector_cls(value)
         elif arg == 'rtp':
             positions = value.split(" ")
-            if not self.is_rotor_arg_value_valid(positions):
+            if not self.is_rotor_positions_valid(positions):
                 return False
             self.set_rotor_positions(positions)
         elif arg == 'rtr':
             settings = value.split(" ")
-            if not self.is_rotor_arg_value_valid(settings):
+            if not self.is_ring_settings_valid(settings):
                 return False
-            self.set_ring_settings(settings)
+            self.set_ring_settings([int(setting) for setting in settings])
         elif arg == 'pl':
             mappings = value.split(" ")
             if not self.is_plug_lead_mappings_valid(mappings):
                 return False
             self.set_plug_lead_mappings(mappings)
+        elif arg == 'in':
+            if not self.is_input_path_valid(value):
+                return False
+            self.set_input_path(value)
+        elif arg == 'wk':
+            if not self.is_workers_valid(value):
+                return False
+            self.set_workers(int(value))
         elif arg == '-h':
             self.print_help()
             return False
@@ -152,7 +247,7 @@ For example:
         ]
 
     def set_reflector_cls(self, label):
-        self.reflector = rotor_cls_from_name(label)
+        self.reflector_cls = rotor_cls_from_name(label)
 
     def set_reflector(self):
         self.reflector = self.reflector_cls()
@@ -166,6 +261,12 @@ For example:
     def set_plug_lead_mappings(self, mappings):
         self.plug_lead_mappings = mappings
 
+    def set_input_path(self, path):
+        self.input_path = STANDARD_INPUT if path == STANDARD_INPUT else pathlib.Path(path)
+
+    def set_workers(self, workers):
+        self.workers = workers
+
     def run(self):
         (_, *args) = sys.argv
 
@@ -174,9 +275,11 @@ For example:
             return
 
         can_proceed = self.parse_args(args)
-        if can_proceed:
-            self.create_machine()
-            self.accept_texts()
+        if can_proceed and self.create_machine():
+            if self.input_path is not None:
+                self.encode_input_file()
+            else:
+                self.accept_texts()
 
 if __name__ == "__main__":
     cli_client = EnigmaCliMachine()
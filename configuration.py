@@ -0,0 +1,53 @@
+from collections import namedtuple
+
+from constants import ALPHABET
+from enigma import EnigmaMachine
+from rotors import rotor_cls_from_name
+
+# Full key of a machine; rotors, ring settings and positions go from the leftmost rotor to the rightmost
+# e.g. KeyConfiguration(('I', 'II', 'III'), 'B', (1, 1, 1), ('A', 'A', 'A'), ('AB', 'CD'))
+KeyConfiguration = namedtuple('KeyConfiguration', ['rotors', 'reflector', 'ring_settings', 'positions', 'plug_leads'])
+
+# Builds a key configuration, normalizing the values to tuples
+def create_configuration(rotors, reflector, ring_settings = None, positions = None, plug_leads = ()):
+    if ring_settings is None:
+        ring_settings = [1] * len(rotors)
+    if positions is None:
+        positions = ['A'] * len(rotors)
+
+    if not len(rotors) == len(ring_settings) == len(positions):
+        raise ValueError('Every rotor needs a ring setting and a position')
+
+    return KeyConfiguration(
+        tuple(rotors),
+        reflector,
+        tuple([int(ring_setting) for ring_setting in ring_settings]),
+        tuple([ALPHABET[position - 1] if isinstance(position, int) else position.upper() for position in positions]),
+        tuple(plug_leads),
+    )
+
+# Builds a machine set to a key configuration
+def create_machine(configuration):
+    rotors = [
+        rotor_cls_from_name(label)(initial_position=position, ring_setting=ring_setting)
+        for label, ring_setting, position in zip(configuration.rotors, configuration.ring_settings, configuration.positions)
+    ]
+
+    return EnigmaMachine(rotors, rotor_cls_from_name(configuration.reflector)(), list(configuration.plug_leads))
+
+# Gets the key configuration of a machine, with the rotors at their initial positions
+def get_machine_configuration(machine):
+    rotors = machine.rotors[::-1]
+
+    plug_leads = []
+    if machine.plug_board is not None:
+        table = machine.plug_board.table
+        plug_leads = [ALPHABET[index] + ALPHABET[table[index]] for index in range(26) if index < table[index]]
+
+    return create_configuration(
+        [rotor.label for rotor in rotors],
+        machine.reflector.label,
+        [rotor.ring_setting for rotor in rotors],
+        [rotor.initial_position for rotor in rotors],
+        plug_leads,
+    )
@@ -1,5 +1,8 @@
 import enum
 
+# The 26 letters every rotor, reflector and plugboard works on
+ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
 
 class RotorDirections(enum.Enum):
     CLOCKWISE = 1
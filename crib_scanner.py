@@ -0,0 +1,95 @@
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from constants import ALPHABET
+
+# A crib placed at an offset of the ciphertext; feeds enigma_search.search_crib and bombe.run_bombe
+CribAlignment = namedtuple('CribAlignment', ['crib', 'offset'])
+
+# Translation tables marking the positions of each letter with '1' and every other byte with '0'
+LETTER_MARKERS = [bytes.maketrans(bytes(range(256)), bytes([ord('1') if byte in (ord(letter), ord(letter.lower())) else ord('0') for byte in range(256)])) for letter in ALPHABET]
+
+"""
+    Finds where cribs can sit in a ciphertext; as a letter never encrypts to itself, a crib cannot
+    sit where any of its letters lines up with the same ciphertext letter
+
+    The ciphertext is read once into one bitset per letter (a Python int whose bit i is set when the
+    letter is at position i). The conflicting offsets of a crib are then the OR of the bitsets of
+    its letters, each shifted by the letter's place in the crib: every offset is checked at once,
+    len(crib) big int operations per crib.
+
+    :param ciphertext: Text or ASCII bytes; characters other than A to Z never conflict
+"""
+class CribScanner:
+    def __init__(self, ciphertext):
+        if isinstance(ciphertext, str):
+            ciphertext = ciphertext.encode('ascii')
+
+        self.length = len(ciphertext)
+
+        # Reversed so the first character ends up as the lowest bit
+        reversed_ciphertext = bytes(ciphertext[::-1])
+        self.letter_masks = [int(reversed_ciphertext.translate(marker) or b'0', 2) for marker in LETTER_MARKERS]
+
+    # Bitset of the offsets (bit i for offset i) at which a crib does not conflict with the ciphertext
+    def get_valid_mask(self, crib):
+        offsets_count = self.length - len(crib) + 1
+        if len(crib) == 0 or offsets_count <= 0:
+            return 0
+
+        conflicts = 0
+        letter_masks = self.letter_masks
+        for place, character in enumerate(crib.upper()):
+            if character in ALPHABET:
+                conflicts |= letter_masks[ord(character) - ord('A')] >> place
+
+        all_offsets = (1 << offsets_count) - 1
+
+        return (conflicts & all_offsets) ^ all_offsets
+
+    # Number of offsets at which a crib can sit
+    def count_offsets(self, crib):
+        return count_bits(self.get_valid_mask(crib))
+
+    # Offsets at which a crib can sit, in increasing order (a NumPy array when NumPy is installed)
+    def get_offsets(self, crib):
+        return get_mask_offsets(self.get_valid_mask(crib), self.length)
+
+    # Offsets of every crib, as {crib: offsets}
+    def scan(self, cribs):
+        return {crib: self.get_offsets(crib) for crib in cribs}
+
+    # Crib alignments of every crib, crib by crib, in increasing offsets
+    def iter_alignments(self, cribs):
+        for crib in cribs:
+            for offset in self.get_offsets(crib):
+                yield CribAlignment(crib, int(offset))
+
+# Number of set bits of a bitset (int.bit_count needs Python 3.10)
+def count_bits(mask):
+    if hasattr(mask, 'bit_count'):
+        return mask.bit_count()
+
+    return bin(mask).count('1')
+
+# Set bits of a bitset holding up to length bits
+def get_mask_offsets(mask, length):
+    mask_bytes = mask.to_bytes((length + 7) // 8, 'little')
+
+    if np is not None:
+        return np.flatnonzero(np.unpackbits(np.frombuffer(mask_bytes, dtype=np.uint8), bitorder='little'))
+
+    offsets = []
+    for byte_index, byte in enumerate(mask_bytes):
+        if byte:
+            offsets.extend([byte_index * 8 + bit for bit in range(8) if byte >> bit & 1])
+
+    return offsets
+
+# Offsets at which a crib can sit in a ciphertext
+def find_crib_offsets(ciphertext, crib):
+    return CribScanner(ciphertext).get_offsets(crib)
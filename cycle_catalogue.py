@@ -0,0 +1,273 @@
+import array
+import bisect
+import itertools
+import json
+import mmap
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from configuration import create_configuration
+from constants import ALPHABET
+from enigma_search import REFLECTOR_LABELS, ROTOR_LABELS, to_indices
+from scrambler import OFFSET_COMBINATIONS, PositionSweep
+
+# Header of the catalogue files
+CATALOGUE_FILE_MAGIC = b'RJWC'
+
+# Number of key presses of a doubled three letter indicator
+INDICATOR_LENGTH = 6
+
+# Every cycle structure of a product of two reflections: its cycles come in pairs of equal length,
+# so it is a partition of 13 (the length of one cycle of each pair)
+def get_partitions(total, largest = None):
+    if total == 0:
+        return [()]
+
+    largest = total if largest is None else largest
+    return [(part,) + rest for part in range(min(total, largest), 0, -1) for rest in get_partitions(total - part, part)]
+
+PARTITIONS = get_partitions(13)
+PARTITION_INDICES = {partition: index for index, partition in enumerate(PARTITIONS)}
+
+# Lengths of the cycles of a permutation, longest first
+def get_cycle_lengths(permutation):
+    seen = [False] * len(permutation)
+    lengths = []
+    for start in range(len(permutation)):
+        length = 0
+        index = start
+        while not seen[index]:
+            seen[index] = True
+            index = permutation[index]
+            length += 1
+        if length:
+            lengths.append(length)
+
+    return sorted(lengths, reverse=True)
+
+# Index of the cycle structure of a product of two reflections (None when it is not one)
+def get_cycle_structure(permutation):
+    lengths = get_cycle_lengths(permutation)
+    if len(lengths) % 2 or lengths[::2] != lengths[1::2]:
+        return None
+
+    return PARTITION_INDICES[tuple(lengths[::2])]
+
+# Signature of the three cycle structures of the AD, BE and CF products
+def get_signature(structures):
+    (first, second, third) = structures
+
+    return (first * len(PARTITIONS) + second) * len(PARTITIONS) + third
+
+# Cycle structures of a signature, as (AD, BE, CF) partitions of 13
+def get_signature_structures(signature):
+    return (
+        PARTITIONS[signature // len(PARTITIONS) ** 2],
+        PARTITIONS[signature // len(PARTITIONS) % len(PARTITIONS)],
+        PARTITIONS[signature % len(PARTITIONS)],
+    )
+
+"""
+    Signature of a day's indicators (the doubled message keys as enciphered, E.g. 'DMQVBN')
+    Letters 1 and 4 of an indicator come from the same letter, so the indicators give the AD
+    product (and likewise BE and CF) letter by letter; every letter has to show up in each place
+    :raises ValueError: When the indicators contradict each other or do not give the full products
+"""
+def get_indicators_signature(indicators):
+    structures = []
+    for place in range(3):
+        product = [-1] * 26
+        for indicator in indicators:
+            if len(indicator) != INDICATOR_LENGTH:
+                raise ValueError(f'An indicator has {INDICATOR_LENGTH} letters; got {indicator!r}')
+
+            (first, second) = to_indices(indicator[place] + indicator[place + 3])
+            if product[first] not in (-1, second):
+                raise ValueError(f'The indicators contradict each other on {indicator[place]}')
+            product[first] = second
+
+        if -1 in product:
+            raise ValueError(f'The indicators do not give the whole {"ABC"[place]}{"DEF"[place]} product yet')
+
+        structure = get_cycle_structure(product)
+        if structure is None:
+            raise ValueError(f'The {"ABC"[place]}{"DEF"[place]} product is not a product of two reflections')
+        structures.append(structure)
+
+    return get_signature(structures)
+
+# Signatures of every start position (numbered as scrambler.get_offsets_index) of one rotor order and reflector
+# The plugboard only conjugates the products, which keeps their cycle structures
+def get_unit_signatures(unit):
+    (rotors, reflector) = unit
+    sweep = PositionSweep(rotors, reflector, (1, 1, 1), INDICATOR_LENGTH)
+    permutations = sweep.permutations
+
+    signatures = array.array('I')
+    for window_start in sweep.window_starts:
+        window = permutations[window_start:window_start + INDICATOR_LENGTH]
+        structures = []
+        for place in range(3):
+            (first, second) = (window[place], window[place + 3])
+            structures.append(get_cycle_structure([second[index] for index in first]))
+        signatures.append(get_signature(structures))
+
+    return signatures
+
+# Name of the part file of a unit in a build directory
+def get_part_path(parts_path, unit):
+    (rotors, reflector) = unit
+
+    return os.path.join(parts_path, '-'.join(rotors) + f'-{reflector}.bin')
+
+# Computes the signatures of a unit into its part file; the file only appears once it is complete
+def build_part(parts_path, unit):
+    part_path = get_part_path(parts_path, unit)
+    signatures = get_unit_signatures(unit)
+    if sys.byteorder == 'big':
+        signatures.byteswap()
+
+    with open(part_path + '.tmp', 'wb') as file:
+        signatures.tofile(file)
+    os.replace(part_path + '.tmp', part_path)
+
+    return unit
+
+"""
+    Builds the catalogue of the cycle structures of every rotor order, reflector and start position
+    Ring settings are taken as 1, so a start position stands for the rotor offsets (position minus
+    ring setting) of the key.
+
+    Each (rotor order, reflector) is computed into its own part file next to the catalogue, in
+    parallel; an interrupted build picks up from the parts already there. The parts are then
+    merged into the catalogue: a header, the signatures in increasing order and the setting of
+    each (little endian uint32 arrays), which CycleCatalogue memory maps.
+
+    :param rotor_orders: Rotor labels from left to right; all orders of three of I to V by default
+    :param reflectors: Reflector labels; A, B and C by default
+    :param workers: Number of worker processes (defaults to the number of CPUs)
+"""
+def build_catalogue(path, rotor_orders = None, reflectors = None, workers = None):
+    rotor_orders = [tuple(order) for order in (itertools.permutations(ROTOR_LABELS, 3) if rotor_orders is None else rotor_orders)]
+    if any(len(order) != 3 for order in rotor_orders):
+        raise ValueError('The catalogue covers three rotor orders')
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    units = list(itertools.product(rotor_orders, REFLECTOR_LABELS if reflectors is None else reflectors))
+    parts_path = path + '.parts'
+    os.makedirs(parts_path, exist_ok=True)
+
+    pending = [unit for unit in units if not os.path.exists(get_part_path(parts_path, unit))]
+    if workers == 1 or len(pending) <= 1:
+        for unit in pending:
+            build_part(parts_path, unit)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(build_part, itertools.repeat(parts_path), pending))
+
+    # Records sort by signature, then setting (unit index * 26^3 + start position number)
+    records = array.array('Q')
+    for unit_index, unit in enumerate(units):
+        signatures = array.array('I')
+        with open(get_part_path(parts_path, unit), 'rb') as file:
+            signatures.fromfile(file, OFFSET_COMBINATIONS)
+        if sys.byteorder == 'big':
+            signatures.byteswap()
+
+        setting_base = unit_index * OFFSET_COMBINATIONS
+        records.extend([signature << 32 | setting_base + number for number, signature in enumerate(signatures)])
+
+    records = sorted(records)
+    signatures = array.array('I', [record >> 32 for record in records])
+    settings = array.array('I', [record & 0xFFFFFFFF for record in records])
+    if sys.byteorder == 'big':
+        signatures.byteswap()
+        settings.byteswap()
+
+    # The arrays start on an 8 byte boundary
+    header = json.dumps({'units': units, 'records': len(records)}).encode('ascii')
+    header += b' ' * (-(len(CATALOGUE_FILE_MAGIC) + 4 + len(header)) % 8)
+
+    with open(path + '.tmp', 'wb') as file:
+        file.write(CATALOGUE_FILE_MAGIC)
+        file.write(len(header).to_bytes(4, 'little'))
+        file.write(header)
+        signatures.tofile(file)
+        settings.tofile(file)
+    os.replace(path + '.tmp', path)
+
+    shutil.rmtree(parts_path)
+
+"""
+    Memory mapped catalogue written by build_catalogue; queries binary search the signatures
+    without reading the file
+"""
+class CycleCatalogue:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.signatures = self.settings = None
+
+        if self.map[:len(CATALOGUE_FILE_MAGIC)] != CATALOGUE_FILE_MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a cycle structure catalogue')
+
+        header_start = len(CATALOGUE_FILE_MAGIC) + 4
+        header_length = int.from_bytes(self.map[len(CATALOGUE_FILE_MAGIC):header_start], 'little')
+        header = json.loads(self.map[header_start:header_start + header_length].decode('ascii'))
+
+        self.units = [(tuple(rotors), reflector) for rotors, reflector in header['units']]
+        self.length = header['records']
+
+        arrays_start = header_start + header_length
+        signatures_end = arrays_start + 4 * self.length
+        if sys.byteorder == 'big':
+            # Big endian machines read the arrays into memory instead
+            self.signatures = array.array('I', self.map[arrays_start:signatures_end])
+            self.settings = array.array('I', self.map[signatures_end:signatures_end + 4 * self.length])
+            self.signatures.byteswap()
+            self.settings.byteswap()
+        else:
+            with memoryview(self.map) as view:
+                self.signatures = view[arrays_start:signatures_end].cast('I')
+                self.settings = view[signatures_end:signatures_end + 4 * self.length].cast('I')
+
+    def __len__(self):
+        return self.length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        # The memory map cannot close while views of it are alive
+        for values in (self.signatures, self.settings):
+            if isinstance(values, memoryview):
+                values.release()
+        self.signatures = self.settings = None
+        self.map.close()
+        self.file.close()
+
+    # Key configuration (ring settings 1, no plugboard) of a catalogue setting
+    def get_configuration(self, setting):
+        (rotors, reflector) = self.units[setting // OFFSET_COMBINATIONS]
+        number = setting % OFFSET_COMBINATIONS
+        positions = [ALPHABET[number // 676], ALPHABET[number // 26 % 26], ALPHABET[number % 26]]
+
+        return create_configuration(rotors, reflector, None, positions)
+
+    # Key configurations whose indicator products have a signature
+    def query(self, signature):
+        start = bisect.bisect_left(self.signatures, signature)
+        end = bisect.bisect_right(self.signatures, signature, start)
+
+        return [self.get_configuration(self.settings[index]) for index in range(start, end)]
+
+    # Key configurations matching a day's indicators
+    def query_indicators(self, indicators):
+        return self.query(get_indicators_signature(indicators))
@@ -1,14 +1,48 @@
 
-from constants import CurrentFlowDirections
+import array
+import json
+import mmap
+import os
+import sys
+
+import re
+
+import parallel
+import vectorized
+from constants import ALPHABET
 from rotors import *
+from stepping import get_notch_index, get_positions_after_key_presses
 
 PLUG_LEADS_LIMIT = 10
 
+# Engines available for encoding whole texts
+ENCODING_ENGINES = ['python', 'numpy']
+
+# Number of characters read at a time when encoding files
+STREAM_CHUNK_SIZE = 1 << 16
+
+# Splits a text into runs of upper case letters (even items) and runs of anything else (odd items)
+LETTER_RUNS_PATTERN = re.compile('([^A-Z]+)')
+
+# Splits a text into lines (even items) and runs of line breaks (odd items)
+LINE_BREAKS_PATTERN = re.compile('([\r\n]+)')
+
+# Any byte outside A to Z, searched in buffers without copying them
+NON_LETTER_BYTE_PATTERN = re.compile(b'[^A-Z]')
+
+# Header of the compiled machine files
+COMPILED_MACHINE_FILE_MAGIC = b'ENGC'
+
+# Number of states of the three stepping rotors of a compiled machine
+COMPILED_STATES = 26 ** 3
+
 class PlugLead:
     def __init__(self, mapping):
         self.setMapping(mapping)
 
+    # Leads connect letters whatever their case, E.g. "ab" is the same lead as "AB"
     def setMapping(self, mapping):
+        mapping = [character.upper() for character in mapping]
         if len(mapping) != 2 or mapping[0] == mapping[1]:
             raise ValueError('You can only connect 2 leads and they must be of different values')
 
@@ -24,29 +58,199 @@ class PlugLead:
 
 class Plugboard:
     def __init__(self, plug_leads = []):
-        self.plug_leads = plug_leads
+        self.plug_leads = list(plug_leads)
+        self.set_table(self.compile(self.plug_leads))
 
-    def encode(self, character):
-        result = character
-        for plug_lead in self.plug_leads:
-            result = plug_lead.encode(character)
+    # Compiles plug leads into a 26 entry permutation of zero based indices; validates the leads once
+    @staticmethod
+    def compile(plug_leads):
+        table = list(range(26))
+        connected = set()
+        for plug_lead in plug_leads:
+            for character, connected_character in plug_lead.mapping.items():
+                if len(character) != 1 or character not in ALPHABET:
+                    raise ValueError(f'Plug leads can only connect the letters between A and Z; got {character!r}')
+                if character in connected:
+                    raise ValueError(f'The letter {character} is connected by more than one plug lead')
+
+                connected.add(character)
+                table[get_index_for_character(character)] = get_index_for_character(connected_character)
+
+        return tuple(table)
+
+    # Sets the compiled permutation and the translation tables derived from it
+    def set_table(self, table):
+        self.table = table
 
-            # Break as early as possible
-            if result != character:
-                break
+        encoded_alphabet = ''.join([get_character_for_index(index) for index in table])
+        self.mapping = {character: encoded for character, encoded in zip(ALPHABET, encoded_alphabet) if character != encoded}
 
-        return result
+        # For whole message passes with str.translate and bytes.translate
+        self.translation_table = str.maketrans(ALPHABET, encoded_alphabet)
+        self.bytes_translation_table = bytes.maketrans(ALPHABET.encode('ascii'), encoded_alphabet.encode('ascii'))
+
+    def encode(self, character):
+        return self.mapping.get(character, character)
+
+    def encode_index(self, index):
+        return self.table[index]
 
     def add(self, plug_lead):
         if len(self.plug_leads) == PLUG_LEADS_LIMIT:
             raise Exception(f'You cannot have more than {PLUG_LEADS_LIMIT} plug leads')
 
-        self.plug_leads.append(plug_lead)
+        plug_leads = self.plug_leads + [plug_lead]
+        self.set_table(self.compile(plug_leads))
+        self.plug_leads = plug_leads
 
     @staticmethod
     def generate_plug_leads(mapping = []):
         return [PlugLead(pair) for pair in mapping]
 
+    # Builds a plugboard straight from a 26 entry permutation of zero based indices
+    @staticmethod
+    def from_table(table):
+        if len(table) != 26 or any(table[mapped_index] != index for index, mapped_index in enumerate(table)):
+            raise ValueError('A plugboard table must be a permutation of 26 indices which is its own inverse')
+
+        plug_leads = [get_character_for_index(index) + get_character_for_index(mapped_index) for index, mapped_index in enumerate(table) if index < mapped_index]
+
+        return Plugboard(Plugboard.generate_plug_leads(plug_leads))
+
+"""
+    Scrambler (rotors and reflector) permutations for each key press of a message, without the plugboard
+    Row i of the flat permutations bytes is the permutation at the (i + 1)th key press. As the plugboard
+    is its own inverse, any plugboard P is applied as the conjugation P . S . P of those rows, so trying
+    plugboards on a message costs table lookups only and no rotor work.
+
+    :param permutations: length * 26 bytes of zero based indices
+"""
+class ScramblerCore:
+    def __init__(self, permutations):
+        if len(permutations) % 26 != 0:
+            raise ValueError('The permutations must be 26 entries per key press')
+
+        self.permutations = bytes(permutations)
+        self.length = len(self.permutations) // 26
+
+    # Permutation at a key press (zero based), conjugated by a plugboard table (or None for no plugboard)
+    def get_permutation(self, key_press, plugboard_table = None):
+        row = self.permutations[key_press * 26:(key_press + 1) * 26]
+        if plugboard_table is None:
+            return row
+
+        return bytes([plugboard_table[row[plugboard_table[index]]] for index in range(26)])
+
+    # Encodes an upper case A to Z text from the first key press, through a Plugboard (or None for no plugboard)
+    def encode_text(self, text, plugboard = None, engine = 'python'):
+        if engine not in ENCODING_ENGINES:
+            raise ValueError(f'The encoding engine must be one of {ENCODING_ENGINES}')
+        if len(text) > self.length:
+            raise ValueError(f'The scrambler core only covers {self.length} key presses')
+        if len(text) > 0 and not vectorized.can_vectorize_text(text):
+            raise ValueError('Only upper case letters between A and Z can be encoded')
+
+        message = text.encode('ascii')
+        if plugboard is not None:
+            message = message.translate(plugboard.bytes_translation_table)
+
+        if engine == 'numpy' and vectorized.is_numpy_available():
+            encoded = vectorized.encode_with_core(self.permutations, message)
+        else:
+            permutations = self.permutations
+            ord_a = ord('A')
+            encoded = bytes([permutations[offset + byte - ord_a] + ord_a for offset, byte in zip(range(0, len(message) * 26, 26), message)])
+
+        if plugboard is not None:
+            encoded = encoded.translate(plugboard.bytes_translation_table)
+
+        return encoded.decode('ascii')
+
+"""
+    A machine with a fixed key compiled to a finite automaton over the positions of its three
+    stepping rotors (rotors further left never step and are part of the tables)
+    A key press is two lookups: the next state, then the output letter for the state and input.
+    The tables (26^3 x 26 bytes of output letters and 26^3 uint16 next states, about 480 KB) are
+    built on first use, and can be saved to disk and loaded back.
+
+    :param state: Index of the rotor positions, right + 26 * middle + 676 * left (zero based)
+    :param key: Description of the key, saved along with the tables
+"""
+class CompiledMachine:
+    def __init__(self, state, key, build = None, output_table = None, next_states = None):
+        self.initial_state = state
+        self.state = state
+        self.key = key
+        self.build = build
+        self.tables = None if output_table is None else (output_table, next_states)
+
+    # Gets (output table, next states), building them on first use
+    def get_tables(self):
+        if self.tables is None:
+            self.tables = self.build()
+            self.build = None
+
+        return self.tables
+
+    # Returns to the rotor positions the machine was compiled at
+    def reset(self):
+        self.state = self.initial_state
+
+    # Positions of the stepping rotors (left to right) for the current state
+    def get_positions(self):
+        return ''.join([get_character_for_index(self.state // 676), get_character_for_index(self.state // 26 % 26), get_character_for_index(self.state % 26)])
+
+    # Encodes an upper case A to Z text with one lookup per character, carrying on from the current state
+    def encode_text(self, text):
+        if len(text) > 0 and not vectorized.can_vectorize_text(text):
+            raise ValueError('Only upper case letters between A and Z can be encoded')
+
+        (output_table, next_states) = self.get_tables()
+        state = self.state
+        ord_a = ord('A')
+
+        encoded = bytearray(len(text))
+        for i, byte in enumerate(text.encode('ascii')):
+            state = next_states[state]
+            encoded[i] = output_table[state * 26 + byte - ord_a]
+
+        self.state = state
+
+        return encoded.decode('ascii')
+
+    def save(self, path):
+        (output_table, next_states) = self.get_tables()
+        next_states = array.array('H', next_states)
+        if sys.byteorder == 'big':
+            next_states.byteswap()
+
+        header = json.dumps({'key': self.key, 'state': self.initial_state}).encode('ascii')
+        with open(path, 'wb') as file:
+            file.write(COMPILED_MACHINE_FILE_MAGIC)
+            file.write(len(header).to_bytes(4, 'little'))
+            file.write(header)
+            next_states.tofile(file)
+            file.write(output_table)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as file:
+            if file.read(len(COMPILED_MACHINE_FILE_MAGIC)) != COMPILED_MACHINE_FILE_MAGIC:
+                raise ValueError(f'{path} is not a compiled machine file')
+
+            header = json.loads(file.read(int.from_bytes(file.read(4), 'little')).decode('ascii'))
+            next_states = array.array('H')
+            next_states.fromfile(file, COMPILED_STATES)
+            output_table = file.read(COMPILED_STATES * 26)
+
+        if len(output_table) != COMPILED_STATES * 26:
+            raise ValueError(f'{path} is truncated')
+
+        # Files are little endian
+        if sys.byteorder == 'big':
+            next_states.byteswap()
+
+        return CompiledMachine(header['state'], header['key'], output_table=output_table, next_states=next_states)
 
 class EnigmaMachine:
     def __init__(self, rotors, reflector, leads_mapping = []):
@@ -63,12 +267,54 @@ class EnigmaMachine:
         self.reflector = reflector
         self.set_plugboard(leads_mapping)
         self.set_rotor_positions()
+        self.invalidate_inner_segment()
+
+        # Number of key presses since the rotors were at their initial positions
+        self.key_presses = 0
 
     # Setter for the Machine's plugboard
     def set_plugboard(self, leads_mapping):
         plug_leads = Plugboard.generate_plug_leads(leads_mapping)
         self.plug_board = Plugboard(plug_leads)
 
+    # Plugboard mapping as a list of 26 zero based indices (or None for no plugboard)
+    def get_plugboard_table(self):
+        if self.plug_board is None:
+            return None
+
+        return list(self.plug_board.table)
+
+    # Drops the cached permutations of the slow moving rotors and reflector; they are rebuilt on the next key press
+    def invalidate_inner_segment(self):
+        self.inner_segment = None
+        self.effective_reflector = None
+
+    # Translation table of the reflector wrapped in the rotors which never step (the fourth slot and up,
+    # E.g. the Greek rotor of an M4), or None without a reflector
+    # It only changes when one of those rotors or the reflector is set, never on a key press
+    def get_effective_reflector(self):
+        if self.effective_reflector is None and self.reflector is not None:
+            reflector_offset = (self.reflector.current_position - self.reflector.ring_setting) % 26
+            reflector_translation_table = self.reflector.wiring.forward_translation_tables[reflector_offset]
+
+            static_rotors = self.rotors[3:]
+            static_offsets = [(rotor.current_position - rotor.ring_setting) % 26 for rotor in static_rotors]
+
+            self.effective_reflector = get_effective_reflector_table([rotor.wiring for rotor in static_rotors], static_offsets, reflector_translation_table)
+
+        return self.effective_reflector
+
+    # Composed permutation of the stepping rotors after the first slot, the effective reflector and back
+    # through those rotors; it only changes when one of those rotors steps, about once every 26 key presses
+    def get_inner_segment(self):
+        if self.inner_segment is None:
+            inner_rotors = self.rotors[1:3]
+            offsets = [(rotor.current_position - rotor.ring_setting) % 26 for rotor in inner_rotors]
+
+            self.inner_segment = compose_wirings([rotor.wiring for rotor in inner_rotors], offsets, self.get_effective_reflector())
+
+        return self.inner_segment
+
     # Sets the positions of the rotors
     def set_rotor_positions(self):
         for i, rotor in enumerate(self.rotors):
@@ -82,10 +328,13 @@ class EnigmaMachine:
             raise IndexError(f'The machine only supports {len(self.rotors)} rotors')
 
         self.rotors[rotor_index] = rotor
+        self.invalidate_inner_segment()
+        self.rebase_message_key()
 
     # Setter for the Machine's reflector
     def set_reflector(self, reflector):
         self.reflector = reflector
+        self.invalidate_inner_segment()
 
     # Sets a single Machine rotor initial position
     def set_single_initial_position(self, slot_position, rotor_initial_position):
@@ -93,6 +342,8 @@ class EnigmaMachine:
             raise IndexError(f'The machine only supports {len(self.rotors)} rotors')
 
         self.rotors[slot_position -1].set_initial_position(rotor_initial_position)
+        self.invalidate_inner_segment()
+        self.rebase_message_key()
 
     # Sets a single Machine rotor ring setting
     def set_single_ring_setting(self, slot_position, ring_setting):
@@ -100,6 +351,7 @@ class EnigmaMachine:
             raise IndexError(f'The machine only supports {len(self.rotors)} rotors')
 
         self.rotors[slot_position -1].set_ring_setting(ring_setting)
+        self.invalidate_inner_segment()
 
     # Rotates a Single rotor
     def rotate_single_rotor(self, slot_position, direction):
@@ -107,6 +359,8 @@ class EnigmaMachine:
             raise IndexError(f'The machine only supports {len(self.rotors)} rotors')
 
         self.rotors[slot_position -1].rotate(direction)
+        self.invalidate_inner_segment()
+        self.rebase_message_key()
 
     # Metadata for the rotor
     def get_rotors_meta_data(self):
@@ -118,10 +372,94 @@ class EnigmaMachine:
 
         return (positions, ring_settings)
 
+    # Compact immutable state of the machine: rotor positions, ring settings, keystroke offset and the
+    # initial positions the offset counts from
+    def snapshot(self):
+        return (
+            tuple([rotor.current_position for rotor in self.rotors]),
+            tuple([rotor.ring_setting for rotor in self.rotors]),
+            self.key_presses,
+            tuple([rotor.initial_position for rotor in self.rotors]),
+        )
+
+    # Returns the machine to a state taken with snapshot, without rebuilding anything
+    def restore(self, state):
+        (positions, ring_settings, key_presses, initial_positions) = state
+
+        if len(positions) != len(self.rotors):
+            raise ValueError(f'The state is for {len(positions)} rotors but the machine has {len(self.rotors)}')
+
+        rotors = self.rotors
+        for i in range(len(rotors)):
+            rotors[i].current_position = positions[i]
+            rotors[i].ring_setting = ring_settings[i]
+            rotors[i].initial_position = initial_positions[i]
+
+        self.key_presses = key_presses
+        self.invalidate_inner_segment()
+
+    # Makes the current rotor positions the message key the keystroke offset counts from
+    def rebase_message_key(self):
+        for rotor in self.rotors:
+            rotor.initial_position = rotor.current_position
+
+        self.key_presses = 0
+
+    # Rebases the message key when the rotors were moved other than by key presses (E.g. Rotor.rotate
+    # called on a rotor directly), so the keystroke offset always leads to the current positions
+    def sync_message_key(self):
+        initial_positions = [rotor.initial_position - 1 for rotor in self.rotors]
+        notches = [get_notch_index(rotor) for rotor in self.rotors]
+        positions = get_positions_after_key_presses(initial_positions, notches, self.key_presses)
+
+        if any(position % 26 + 1 != rotor.current_position for rotor, position in zip(self.rotors, positions)):
+            self.rebase_message_key()
+
+    # Keystroke offset of the machine, relative to the message key (the positions the rotors were last set to)
+    def tell(self):
+        self.sync_message_key()
+
+        return self.key_presses
+
+    # Moves the rotors to where they are after a number of key presses from the message key
+    def seek(self, key_presses):
+        if key_presses < 0:
+            raise ValueError('The keystroke offset cannot be negative')
+
+        self.sync_message_key()
+
+        initial_positions = [rotor.initial_position - 1 for rotor in self.rotors]
+        notches = [get_notch_index(rotor) for rotor in self.rotors]
+        positions = get_positions_after_key_presses(initial_positions, notches, key_presses)
+
+        for rotor, position in zip(self.rotors, positions):
+            rotor.current_position = position % 26 + 1
+
+        self.key_presses = key_presses
+        self.invalidate_inner_segment()
+
+    # Moves the rotors forward by a number of key presses from where they are, without encoding anything
+    def advance(self, key_presses):
+        if key_presses < 0:
+            raise ValueError('The rotors cannot move back')
+
+        positions = [rotor.current_position - 1 for rotor in self.rotors]
+        notches = [get_notch_index(rotor) for rotor in self.rotors]
+        positions = get_positions_after_key_presses(positions, notches, key_presses)
+
+        for rotor, position in zip(self.rotors, positions):
+            rotor.current_position = position % 26 + 1
+
+        self.key_presses += key_presses
+        self.invalidate_inner_segment()
+
     # Simulates the rotations that happen on a key press
     def perform_rotations(self):
+        self.key_presses += 1
+
+        # Only the three rightmost rotors step; the ones further left stay in the effective reflector
         turnover_signaled = False
-        for rotor in self.rotors:
+        for rotor in self.rotors[:3]:
             # Store before rotation
             is_at_notch = rotor.is_at_notch
 
@@ -131,9 +469,11 @@ class EnigmaMachine:
             # Rotors in other slot should rotate on turnover
             elif turnover_signaled:
                 rotor.rotate()
+                self.inner_segment = None
             # Notch point causes rotation for only the second rotor
             elif is_at_notch and rotor.position_in_slots == 2:
                 rotor.rotate()
+                self.inner_segment = None
 
             # Notch point causes "Turnover" in next rotor | only in 3 rotor system
             if is_at_notch and rotor.position_in_slots < 3:
@@ -141,7 +481,21 @@ class EnigmaMachine:
             else:
                 turnover_signaled = False
 
+    # Simulates the current flowing through the rotors, reflector and back, for a zero based index
+    # Only the first rotor is looked up per key; the rest of the path is the cached inner segment
+    def scramble_index(self, index):
+        first_rotor = self.rotors[0]
+        wiring = first_rotor.wiring
+        offset = (first_rotor.current_position - first_rotor.ring_setting) % 26
+
+        index = wiring.forward_tables[offset][index]
+        index = self.get_inner_segment()[index]
+
+        # Current flow in the reverse direction
+        return wiring.reverse_tables[offset][index]
+
     # Simulates the machine's operation on a key press
+    # Every character is a key press; characters other than letters enter the first rotor as a letter (see Rotor.get_entry_index)
     def handle_key_press(self, character_key):
         self.perform_rotations()
 
@@ -151,28 +505,188 @@ class EnigmaMachine:
         if self.plug_board is not None:
             encoded_char = self.plug_board.encode(character_key)
 
-        for rotor in self.rotors:
-            encoded_char = rotor.handle_key_encoding(encoded_char, CurrentFlowDirections.FORWARD)
+        # Rotors and reflector work on zero based indices through their lookup tables
+        if is_letter(encoded_char):
+            index = get_index_for_character(encoded_char)
+        else:
+            index = self.rotors[0].get_entry_index(encoded_char)
 
-        if self.reflector is not None:
-            encoded_char = self.reflector.handle_key_encoding(encoded_char)
-
-        # Current flow in the reverse direction
-        for rotor in self.rotors[::-1]:
-            encoded_char = rotor.handle_key_encoding(encoded_char, CurrentFlowDirections.REVERSE)
+        index = self.scramble_index(index)
 
         if self.plug_board is not None:
-            encoded_char = self.plug_board.encode(encoded_char)
-
-        return encoded_char
+            index = self.plug_board.encode_index(index)
+
+        return get_character_for_index(index)
+
+    # Scrambler permutations of the next key presses, computed once for trying plugboards; the rotors do not move
+    def get_scrambler_core(self, length):
+        state = self.snapshot()
+        first_rotor = self.rotors[0]
+        wiring = first_rotor.wiring
+        rows = []
+
+        try:
+            for _ in range(length):
+                self.perform_rotations()
+
+                # First rotor, cached inner segment and the first rotor again, one bytes.translate each
+                offset = (first_rotor.current_position - first_rotor.ring_setting) % 26
+                inner_segment = self.get_inner_segment() + TRANSLATION_TABLE_TAIL
+                rows.append(wiring.forward_tables[offset].translate(inner_segment).translate(wiring.reverse_translation_tables[offset]))
+        finally:
+            self.restore(state)
+
+        return ScramblerCore(b''.join(rows))
+
+    # Compiles the machine, at its current rotor positions, to a table driven automaton (built on first use)
+    def compile(self):
+        if len(self.rotors) < 3:
+            raise ValueError('Compiling needs the three stepping rotors')
+
+        # Everything the tables depend on is taken now; later changes to the machine do not affect them
+        wirings = [rotor.wiring for rotor in self.rotors]
+        ring_offsets = [rotor.ring_setting - 1 for rotor in self.rotors]
+        notches = [get_notch_index(rotor) for rotor in self.rotors[:3]]
+        reflector_translation_table = self.get_effective_reflector()
+        plugboard = bytes(self.get_plugboard_table() or range(26))
+
+        def build():
+            # Letters for every rotor offsets (right + 26 * middle + 676 * left), plugboard on both sides
+            plugboard_translation_table = bytes([ord('A') + index for index in plugboard]) + TRANSLATION_TABLE_TAIL
+            rows = [
+                plugboard.translate(row + TRANSLATION_TABLE_TAIL).translate(plugboard_translation_table)
+                for row in compose_stepping_wirings(wirings[:3], reflector_translation_table)
+            ]
+
+            output_table = []
+            next_states = array.array('H', [0] * COMPILED_STATES)
+            for state in range(COMPILED_STATES):
+                positions = (state % 26, state // 26 % 26, state // 676)
+                offsets = [(position - ring_offset) % 26 for position, ring_offset in zip(positions, ring_offsets)]
+                output_table.append(rows[(offsets[2] * 26 + offsets[1]) * 26 + offsets[0]])
+
+                (right, middle, left) = [position % 26 for position in get_positions_after_key_presses(positions, notches, 1)]
+                next_states[state] = (left * 26 + middle) * 26 + right
+
+            return (b''.join(output_table), next_states)
+
+        (right, middle, left) = [rotor.current_position - 1 for rotor in self.rotors[:3]]
+        key = {
+            'rotors': [rotor.label for rotor in self.rotors[::-1]],
+            'reflector': None if self.reflector is None else self.reflector.label,
+            'ring_settings': [rotor.ring_setting for rotor in self.rotors[::-1]],
+            'positions': ''.join([rotor.current_character for rotor in self.rotors[::-1]]),
+            'plugboard': ''.join([get_character_for_index(index) for index in plugboard]),
+        }
+
+        return CompiledMachine((left * 26 + middle) * 26 + right, key, build)
 
     # Simulates pressing multiple keys in succession
-    def encode_text(self, text):
-        result = ''
-        for character in text:
-            result += self.handle_key_press(character)
+    def encode_text(self, text, engine = 'python'):
+        if engine not in ENCODING_ENGINES:
+            raise ValueError(f'The encoding engine must be one of {ENCODING_ENGINES}')
+
+        if len(text) == 0:
+            return ''
+
+        # The NumPy engine takes any ASCII text in a single pass
+        if engine == 'numpy' and vectorized.is_numpy_available() and text.isascii():
+            return vectorized.encode_text(self, text)
+
+        # Runs of upper case letters take the whole text path; anything else goes key by key
+        if not vectorized.can_vectorize_text(text):
+            runs = LETTER_RUNS_PATTERN.split(text)
+            return ''.join([
+                self.encode_text(run, engine) if index % 2 == 0 else ''.join([self.handle_key_press(character) for character in run])
+                for index, run in enumerate(runs)
+            ])
+
+        # The plugboard passes run over the whole message at once
+        if self.plug_board is not None:
+            text = text.translate(self.plug_board.translation_table)
 
-        return result
+        encoded = bytearray(len(text))
+        for i, byte in enumerate(text.encode('ascii')):
+            self.perform_rotations()
+            encoded[i] = self.scramble_index(byte - ord('A')) + ord('A')
+
+        if self.plug_board is not None:
+            encoded = encoded.translate(self.plug_board.bytes_translation_table)
+
+        return encoded.decode('ascii')
+
+    # Encodes a text whose lines form one message; the line breaks are not key presses (as with texts typed line
+    # by line) and are kept as they are, so the text can be cut anywhere and encoded a piece at a time
+    def encode_lines(self, text, engine = 'python'):
+        runs = LINE_BREAKS_PATTERN.split(text)
+
+        return ''.join([self.encode_text(run, engine) if index % 2 == 0 else run for index, run in enumerate(runs)])
+
+    # Encodes chunks of lines lazily (see encode_lines); the rotors carry on from one chunk to the next, so
+    # wherever the chunks are cut the result is the same as for the whole text
+    def encode_stream(self, chunks, engine = 'python'):
+        for chunk in chunks:
+            yield self.encode_lines(chunk, engine)
+
+    # Encodes a (text mode) file object into another, holding a single chunk in memory at a time; the file's
+    # line breaks are written out as they are (see encode_lines)
+    def encode_file(self, src, dst, chunk_size = STREAM_CHUNK_SIZE, engine = 'python'):
+        if chunk_size < 1:
+            raise ValueError('The chunk size must be positive')
+
+        characters_count = 0
+        for encoded_chunk in self.encode_stream(iter(lambda: src.read(chunk_size), ''), engine):
+            dst.write(encoded_chunk)
+            characters_count += len(encoded_chunk)
+
+        return characters_count
+
+    # Encodes ASCII A to Z bytes from src (bytes, memoryview, mmap) into the writable dst buffer
+    def encode_into(self, src, dst, engine = 'python'):
+        if engine not in ENCODING_ENGINES:
+            raise ValueError(f'The encoding engine must be one of {ENCODING_ENGINES}')
+
+        src = memoryview(src)
+        if len(dst) < len(src):
+            raise ValueError('The destination buffer is smaller than the source')
+
+        if engine == 'numpy' and vectorized.is_numpy_available():
+            return vectorized.encode_into(self, src, dst)
+
+        # Checked before anything is encoded, so dst and the rotors are untouched by a bad source
+        invalid_byte = NON_LETTER_BYTE_PATTERN.search(src)
+        if invalid_byte is not None:
+            raise ValueError(f'Only the bytes between A and Z can be encoded; got {src[invalid_byte.start()]} at {invalid_byte.start()}')
+
+        plugboard_table = self.get_plugboard_table() or list(range(26))
+        ord_a = ord('A')
+
+        # Works on the byte values directly; no strings are created along the way
+        for i, byte in enumerate(src):
+            index = byte - ord_a
+            self.perform_rotations()
+
+            index = self.scramble_index(plugboard_table[index])
+            dst[i] = plugboard_table[index] + ord_a
+
+        return len(src)
+
+    # Encodes a file into another through memory maps of both; returns the number of bytes encoded
+    def encode_mapped_file(self, src_path, dst_path, engine = 'python'):
+        with open(src_path, 'rb') as src_file, open(dst_path, 'w+b') as dst_file:
+            size = os.fstat(src_file.fileno()).st_size
+            if size == 0:
+                return 0
+
+            dst_file.truncate(size)
+            with mmap.mmap(src_file.fileno(), 0, access=mmap.ACCESS_READ) as src, \
+                    mmap.mmap(dst_file.fileno(), size, access=mmap.ACCESS_WRITE) as dst:
+                return self.encode_into(src, dst, engine)
+
+    # Encodes a text (str) or a file's contents (os.PathLike) in chunks across a process pool, keeping line breaks
+    # The encoding is written to dst (a file object) in order when given, otherwise it is returned
+    def encode_parallel(self, text_or_path, workers = None, chunk_size = None, engine = 'python', upper_case = False, dst = None):
+        return parallel.encode_parallel(self, text_or_path, workers, chunk_size, engine, upper_case, dst)
 
 if __name__ == "__main__":
     pass
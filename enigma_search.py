@@ -0,0 +1,232 @@
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from configuration import create_configuration
+from constants import ALPHABET
+from enigma import Plugboard
+from rotors import compose_wirings, get_effective_reflector_table, rotor_cls_from_name
+from stepping import get_notch_index, get_positions_after_key_presses
+
+ROTOR_LABELS = ['I', 'II', 'III', 'IV', 'V']
+REFLECTOR_LABELS = ['A', 'B', 'C']
+
+# Number of candidates a worker checks between looks at the stop signal
+STOP_CHECK_INTERVAL = 1024
+
+# Number of tasks queued per worker process
+TASKS_PER_WORKER = 2
+
+# Precompiled tables and notch of a rotor label, shared by every candidate using it
+ROTOR_SPECS_CACHE = {}
+
+# Stop signal of the search a worker process belongs to; set once per process by the pool initializer
+worker_stop_event = None
+
+# Gets (forward tables, reverse tables, zero based notch) for a rotor label
+def get_rotor_spec(label):
+    if label not in ROTOR_SPECS_CACHE:
+        rotor = rotor_cls_from_name(label)()
+        ROTOR_SPECS_CACHE[label] = (rotor.forward_tables, rotor.reverse_tables, get_notch_index(rotor))
+
+    return ROTOR_SPECS_CACHE[label]
+
+# Gets the (interned) wiring of a rotor or reflector label
+def get_rotor_wiring(label):
+    return rotor_cls_from_name(label)().wiring
+
+# Gets the 26 entry permutation of a reflector label
+def get_reflector_table(label):
+    return get_rotor_spec(label)[0][0]
+
+# Gets the 26 entry permutation of a set of plug leads (E.g. ['AB', 'CD'])
+def get_plugboard_table(plug_leads):
+    return Plugboard.compile(Plugboard.generate_plug_leads(plug_leads))
+
+# Maps characters (a string or a list of letters) to zero based indices
+def to_indices(characters):
+    return [ord(character.upper()) - ord('A') for character in characters]
+
+"""
+    Constraints on the keys a search goes through; every value is a list of the candidates
+    :param rotor_orders: Rotor labels from left to right (E.g. [('I', 'II', 'III')]); all orders of I to V by default
+    :param reflectors: Reflector labels; A, B and C by default
+    :param positions: Candidate start positions per rotor, from left to right; A to Z by default
+    :param ring_settings: Candidate ring settings per rotor, from left to right; 1 to 26 by default
+    :param plug_leads: Candidate plugboards, each a list of leads (E.g. [['AB', 'CD']]); no leads by default
+"""
+class SearchSpace:
+    def __init__(self, rotor_orders = None, reflectors = None, positions = None, ring_settings = None, plug_leads = None, rotor_count = 3):
+        if rotor_orders is None:
+            rotor_orders = itertools.permutations(ROTOR_LABELS, rotor_count)
+
+        self.rotor_orders = [tuple(order) for order in rotor_orders]
+        if len(self.rotor_orders) == 0:
+            raise ValueError('The search needs at least one rotor order')
+
+        rotor_count = len(self.rotor_orders[0])
+        if any(len(order) != rotor_count for order in self.rotor_orders):
+            raise ValueError('Every rotor order must have the same number of rotors')
+
+        self.reflectors = list(REFLECTOR_LABELS if reflectors is None else reflectors)
+        self.positions = [list(ALPHABET)] * rotor_count if positions is None else [list(choices) for choices in positions]
+        self.ring_settings = [list(range(1, 27))] * rotor_count if ring_settings is None else [list(choices) for choices in ring_settings]
+        self.plug_leads = [()] if plug_leads is None else [tuple(leads) for leads in plug_leads]
+
+        if len(self.positions) != rotor_count or len(self.ring_settings) != rotor_count:
+            raise ValueError(f'Positions and ring settings must be given for each of the {rotor_count} rotors')
+
+    # Number of configurations in the search space
+    def count(self):
+        size = len(self.rotor_orders) * len(self.reflectors) * len(self.plug_leads)
+        for choices in self.positions + self.ring_settings:
+            size *= len(choices)
+
+        return size
+
+    # Every (rotor order, reflector, ring settings, plug leads) combination; each sweeps all positions
+    def iter_tasks(self):
+        return itertools.product(self.rotor_orders, self.reflectors, itertools.product(*self.ring_settings), self.plug_leads)
+
+    # Start positions a task sweeps, zero based in slots order (rightmost rotor first), for messages of length key presses
+    def get_start_positions(self, task, length):
+        return list(itertools.product(*[to_indices(choices) for choices in self.positions[::-1]]))
+
+# Identifies if the search a worker belongs to was asked to stop
+def should_stop():
+    return worker_stop_event is not None and worker_stop_event.is_set()
+
+# Pool initializer which hands the stop signal to a worker process
+def init_worker(stop_event):
+    global worker_stop_event
+    worker_stop_event = stop_event
+
+# Checks start positions (zero based, slots order) of one rotor order, reflector, ring settings and plugboard against the crib
+def search_positions(task, start_positions, ciphertext, crib, crib_offset, max_hits):
+    (rotors, reflector, ring_settings, plug_leads) = task
+
+    # Everything below is in slots order (rightmost rotor first); only the first three slots step
+    specs = [get_rotor_spec(label) for label in rotors[:-4:-1]]
+    (first_forward_table, first_reverse_table) = (specs[0][0], specs[0][1])
+    inner_wirings = [get_rotor_wiring(label) for label in rotors[-2:-4:-1]]
+    static_wirings = [get_rotor_wiring(label) for label in rotors[-4::-1]]
+    notches = [spec[2] for spec in specs]
+    ring_offsets = [ring_setting - 1 for ring_setting in ring_settings[::-1]]
+    reflector_translation_table = get_rotor_wiring(reflector).forward_translation_tables[0]
+    slots = range(len(specs))
+
+    # Reflector wrapped in the static rotors (E.g. the Greek rotor of an M4) by their offsets, with the permutations
+    # of the slow moving stepping rotors, that reflector and back by the offsets of the stepping ones after the first slot
+    inner_segments_by_static_offsets = {}
+
+    # The plugboard is its own inverse, so the crib can be compared on the scrambler side of it
+    plugboard = get_plugboard_table(plug_leads)
+    scrambler_inputs = [plugboard[index] for index in to_indices(ciphertext[crib_offset:crib_offset + len(crib)])]
+    scrambler_outputs = [plugboard[index] for index in to_indices(crib)]
+    key_presses = range(crib_offset + 1, crib_offset + len(crib) + 1)
+
+    hits = []
+    for count, positions in enumerate(start_positions):
+        if count % STOP_CHECK_INTERVAL == 0 and should_stop():
+            break
+
+        static_offsets = positions[3:]
+        if static_offsets:
+            static_offsets = tuple([(position - ring_offset) % 26 for position, ring_offset in zip(static_offsets, ring_offsets[3:])])
+
+        if static_offsets not in inner_segments_by_static_offsets:
+            effective_reflector = get_effective_reflector_table(static_wirings, static_offsets, reflector_translation_table)
+            inner_segments_by_static_offsets[static_offsets] = (effective_reflector, {})
+        (effective_reflector, inner_segments) = inner_segments_by_static_offsets[static_offsets]
+
+        stepping_positions = positions[:3]
+        for key_press, index, expected in zip(key_presses, scrambler_inputs, scrambler_outputs):
+            rotor_positions = get_positions_after_key_presses(stepping_positions, notches, key_press)
+            offsets = tuple([(rotor_positions[slot] - ring_offsets[slot]) % 26 for slot in slots])
+
+            inner_segment = inner_segments.get(offsets[1:])
+            if inner_segment is None:
+                inner_segment = inner_segments[offsets[1:]] = compose_wirings(inner_wirings, offsets[1:], effective_reflector)
+
+            index = first_reverse_table[offsets[0]][inner_segment[first_forward_table[offsets[0]][index]]]
+
+            if index != expected:
+                break
+        else:
+            hits.append(create_configuration(rotors, reflector, ring_settings, [ALPHABET[position] for position in positions[::-1]], plug_leads))
+            if max_hits is not None and len(hits) >= max_hits:
+                break
+
+    return hits
+
+"""
+    Finds every configuration in the search space which decrypts the ciphertext to the crib
+    :param crib_offset: Position of the crib in the ciphertext
+    :param max_hits: Stops once this many configurations are found (all of them by default)
+    :param workers: Number of worker processes (defaults to the number of CPUs)
+    :returns: List of configuration.KeyConfiguration in the search space's order
+"""
+def search_crib(ciphertext, crib, space = None, crib_offset = 0, max_hits = None, workers = None):
+    if space is None:
+        space = SearchSpace()
+    if len(crib) == 0 or crib_offset < 0 or crib_offset + len(crib) > len(ciphertext):
+        raise ValueError('The crib must be placed within the ciphertext')
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    tasks = enumerate(space.iter_tasks())
+    results = []
+    hits_count = 0
+
+    if workers == 1:
+        for task_index, task in tasks:
+            hits = search_positions(task, space.get_start_positions(task, crib_offset + len(crib)), ciphertext, crib, crib_offset, max_hits)
+            results.append((task_index, hits))
+            hits_count += len(hits)
+            if max_hits is not None and hits_count >= max_hits:
+                break
+    else:
+        stop_event = multiprocessing.get_context().Event()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(stop_event,)) as executor:
+            pending = {}
+
+            # Keeps a bounded number of tasks queued so an early stop wastes little work
+            def submit_next():
+                for task_index, task in tasks:
+                    start_positions = space.get_start_positions(task, crib_offset + len(crib))
+                    future = executor.submit(search_positions, task, start_positions, ciphertext, crib, crib_offset, max_hits)
+                    pending[future] = task_index
+                    return
+
+            for _ in range(workers * TASKS_PER_WORKER):
+                submit_next()
+
+            # Hits of the tasks finished by task index; only the ones before the first unfinished task count
+            # towards max_hits, so a later task finishing early cannot push out the first hits
+            hits_by_task_index = {}
+            next_task_index = 0
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_index = pending.pop(future)
+                    hits_by_task_index[task_index] = future.result()
+                    results.append((task_index, hits_by_task_index[task_index]))
+
+                while next_task_index in hits_by_task_index:
+                    hits_count += len(hits_by_task_index.pop(next_task_index))
+                    next_task_index += 1
+
+                if max_hits is not None and hits_count >= max_hits:
+                    stop_event.set()
+                    executor.shutdown(cancel_futures=True)
+                    break
+
+                for _ in done:
+                    submit_next()
+
+    results.sort(key=lambda result: result[0])
+    hits = [hit for _, task_hits in results for hit in task_hits]
+
+    return hits if max_hits is None else hits[:max_hits]
@@ -11,6 +11,23 @@ def get_character_for_position(position):
     # TODO: Validate between 1 and 26
     return chr(ord('A') + position - 1)
 
+# Maps from a character to it's zero based index (A is 0)
+def get_index_for_character(character):
+    index = ord(character.upper()) - ord('A')
+
+    if index < 0 or index > 25:
+        raise ValueError(f'Only the characters between A and Z can be encoded; got {character!r}')
+
+    return index
+
+# Identifies if a character is one of the 26 letters (either case)
+def is_letter(character):
+    return len(character) == 1 and character.isascii() and character.isalpha()
+
+# Maps from a zero based index to it's character
+def get_character_for_index(index):
+    return chr(ord('A') + index)
+
 def number_has_odd_digit(value):
     digits_str = str(value)
 
@@ -0,0 +1,158 @@
+import heapq
+import itertools
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from configuration import create_configuration
+from constants import ALPHABET
+from enigma_search import REFLECTOR_LABELS, ROTOR_LABELS, to_indices
+from ngrams import index_of_coincidence
+from scrambler import OFFSET_COMBINATIONS, PositionSweep, get_message_permutations
+
+# Rotor setting ranked by the index of coincidence of its decrypt without a plugboard
+RotorCandidate = namedtuple('RotorCandidate', ['score', 'configuration'])
+
+# Number of start positions scored at once by the vectorized evaluation
+START_POSITIONS_BLOCK = 2048
+
+# Zero based (right, middle, left) start positions of a flat start position number
+def get_start_positions(number):
+    return (number % 26, number // 26 % 26, number // 676)
+
+# Scores a block of start positions with NumPy; every row of the block is decrypted at once
+def score_start_positions_vectorized(permutations, window_starts, ciphertext, numbers):
+    length = ciphertext.shape[0]
+    plaintext = permutations[window_starts[numbers].reshape(-1, 1) + np.arange(length).reshape(1, -1), ciphertext.reshape(1, -1)]
+
+    rows = np.arange(numbers.shape[0]).reshape(-1, 1) * 26
+    counts = np.bincount((rows + plaintext).ravel(), minlength=numbers.shape[0] * 26).reshape(-1, 26)
+
+    return (counts * (counts - 1)).sum(axis=1) / (length * (length - 1))
+
+# Scores a block of start positions one at a time
+def score_start_positions(permutations, window_starts, ciphertext, numbers):
+    scores = []
+    for number in numbers:
+        window = permutations[window_starts[number]:window_starts[number] + len(ciphertext)]
+        scores.append(index_of_coincidence([permutation[index] for permutation, index in zip(window, ciphertext)]))
+
+    return scores
+
+# Ranks every start position of one rotor order, reflector and static rotor positions, keeping the best ones
+def rank_task(task, ciphertext, top):
+    (rotors, reflector, static_positions) = task
+
+    # Ring settings are all 1 while ranking; the refinement moves them afterwards
+    # Static rotors (E.g. the Greek rotor of an M4) are folded into the reflector, so they cost nothing per key press
+    sweep = PositionSweep(rotors, reflector, (1,) * len(rotors), len(ciphertext), static_positions)
+
+    if np is not None:
+        permutations = np.frombuffer(b''.join(sweep.permutations), dtype=np.uint8).reshape(-1, 26)
+        window_starts = np.array(sweep.window_starts, dtype=np.intp)
+        ciphertext = np.array(ciphertext, dtype=np.intp)
+        score_block = score_start_positions_vectorized
+        blocks = [np.arange(start, min(start + START_POSITIONS_BLOCK, OFFSET_COMBINATIONS)) for start in range(0, OFFSET_COMBINATIONS, START_POSITIONS_BLOCK)]
+    else:
+        permutations = sweep.permutations
+        window_starts = sweep.window_starts
+        score_block = score_start_positions
+        blocks = [range(start, min(start + START_POSITIONS_BLOCK, OFFSET_COMBINATIONS)) for start in range(0, OFFSET_COMBINATIONS, START_POSITIONS_BLOCK)]
+
+    # Bounded min heap of (score, start position number)
+    heap = []
+    for numbers in blocks:
+        for number, score in zip(numbers, score_block(permutations, window_starts, ciphertext, numbers)):
+            entry = (float(score), int(number))
+            if len(heap) < top:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heappushpop(heap, entry)
+
+    candidates = []
+    for score, number in heap:
+        positions = [ALPHABET[position] for position in static_positions] + [ALPHABET[position] for position in get_start_positions(number)[::-1]]
+        candidates.append(RotorCandidate(score, create_configuration(rotors, reflector, None, positions)))
+
+    return candidates
+
+# Index of coincidence of the decrypt of a configuration, without its plugboard
+def score_configuration(ciphertext, configuration):
+    permutations = get_message_permutations(configuration.rotors, configuration.reflector, configuration.ring_settings, configuration.positions, len(ciphertext))
+
+    return index_of_coincidence([permutation[index] for permutation, index in zip(permutations, ciphertext)])
+
+"""
+    Refines the ring settings of the right and middle rotors of a candidate
+    Each ring setting is moved together with its rotor's position, so the rotor's wiring stays where
+    it was and only the turnover points move.
+"""
+def refine_ring_settings(ciphertext, candidate):
+    ciphertext = to_indices(ciphertext)
+    (best_score, best) = candidate
+
+    for slot in (-1, -2):
+        slot_best = best
+        for ring_setting in range(1, 27):
+            shift = ring_setting - best.ring_settings[slot]
+            ring_settings = list(best.ring_settings)
+            positions = list(best.positions)
+            ring_settings[slot] = ring_setting
+            positions[slot] = ALPHABET[(ALPHABET.index(positions[slot]) + shift) % 26]
+
+            configuration = best._replace(ring_settings=tuple(ring_settings), positions=tuple(positions))
+            score = score_configuration(ciphertext, configuration)
+            if score > best_score:
+                (best_score, slot_best) = (score, configuration)
+
+        best = slot_best
+
+    return RotorCandidate(best_score, best)
+
+"""
+    Ranks every rotor order and start position by the index of coincidence of its decrypt with an
+    empty plugboard (ring settings all 1), then refines the ring settings of the best candidates
+    :param rotor_orders: Rotor labels from left to right; all orders of three of I to V by default
+    :param reflectors: Reflector labels; A, B and C by default
+    :param static_positions: Candidate positions of every rotor left of the three stepping ones; A to Z by default
+    :param top: Number of candidates kept (and refined)
+    :param workers: Number of worker processes (defaults to the number of CPUs)
+    :returns: List of RotorCandidate, best first; their configurations feed plugboard_recovery
+"""
+def rank_rotor_settings(ciphertext, rotor_orders = None, reflectors = None, top = 100, refine = True, workers = None, static_positions = None):
+    if len(ciphertext) < 2:
+        raise ValueError('The ciphertext needs at least 2 letters')
+
+    rotor_orders = [tuple(order) for order in (itertools.permutations(ROTOR_LABELS, 3) if rotor_orders is None else rotor_orders)]
+    if any(len(order) < 3 or len(order) != len(rotor_orders[0]) for order in rotor_orders):
+        raise ValueError('Every rotor order needs the same number of rotors, at least three')
+
+    static_count = len(rotor_orders[0]) - 3
+    if static_positions is None:
+        static_positions = [ALPHABET] * static_count
+    if len(static_positions) != static_count:
+        raise ValueError('Positions must be given for each rotor left of the three stepping ones')
+
+    reflectors = REFLECTOR_LABELS if reflectors is None else reflectors
+    tasks = list(itertools.product(rotor_orders, reflectors, itertools.product(*[to_indices(choices) for choices in static_positions])))
+    indices = to_indices(ciphertext)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers == 1:
+        results = [rank_task(task, indices, top) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(rank_task, tasks, itertools.repeat(indices), itertools.repeat(top)))
+
+    candidates = heapq.nlargest(top, [candidate for task_candidates in results for candidate in task_candidates], key=lambda candidate: candidate.score)
+
+    if refine:
+        candidates = sorted([refine_ring_settings(ciphertext, candidate) for candidate in candidates], key=lambda candidate: -candidate.score)
+
+    return candidates
@@ -0,0 +1,314 @@
+import itertools
+
+from configuration import create_configuration
+from constants import ALPHABET
+from enigma_search import SearchSpace, get_reflector_table, get_rotor_spec, to_indices
+from rotors import get_all_rotors
+from scrambler import OFFSET_COMBINATIONS, get_effective_reflector, get_offsets_index
+from stepping import get_positions_after_key_presses
+
+# Reflector permutations of every known reflector label; filled on first use
+REFLECTOR_LABELS_BY_TABLE = {}
+
+# Canonical ring setting limits of every start position, by (notches, message length); filled on first use
+CANONICAL_RING_LIMITS_CACHE = {}
+
+# Number of key presses before a value is reached, standing in for never
+NEVER = float('inf')
+
+# Gets the label of the known reflector with a 26 entry permutation (or None)
+def get_reflector_label(table):
+    if len(REFLECTOR_LABELS_BY_TABLE) == 0:
+        for label, rotor_cls in get_all_rotors().items():
+            rotor = rotor_cls()
+            if rotor.notch_character is None and all(rotor.wiring.forward[rotor.wiring.forward[index]] == index for index in range(26)):
+                REFLECTOR_LABELS_BY_TABLE.setdefault(get_reflector_table(label), label)
+
+    return REFLECTOR_LABELS_BY_TABLE.get(bytes(table))
+
+# Key press (from the second one) on which the right rotor first turns the middle one over,
+# given the right rotor's position after the first key press
+def get_first_turnover(position, notch):
+    if notch is None:
+        return NEVER
+
+    return (notch - position) % 26 + 2
+
+# Key press (from the second one) on which the middle rotor first double steps, given its
+# position after the first key press and the right rotor's first turnover
+def get_first_double_step(position, notch, first_turnover):
+    if notch is None:
+        return NEVER
+
+    moves_to_notch = (notch - position) % 26
+    if moves_to_notch == 0:
+        return 2
+
+    return first_turnover + 26 * (moves_to_notch - 1) + 1
+
+# Zero based positions of the stepping rotors (slots order) after the first key press
+def step(positions, notches):
+    return [position % 26 for position in get_positions_after_key_presses(positions, notches, 1)]
+
+# Start positions whose first key press leads to positions, preferring the fewest rotors stepping (or None)
+def get_predecessor(positions, notches):
+    (right, middle, left) = positions
+    for (middle_moves, left_moves) in ((0, 0), (1, 0), (1, 1)):
+        predecessor = [(right - 1) % 26, (middle - middle_moves) % 26, (left - left_moves) % 26]
+        if step(predecessor, notches) == list(positions):
+            return predecessor
+
+    return None
+
+# Canonical positions and ring settings (slots order) of the three stepping rotors
+def canonicalize_stepping_rotors(positions, ring_settings, notches, length):
+    first = step(positions, notches)
+    offsets = [(position - ring_setting + 1) % 26 for position, ring_setting in zip(first, ring_settings)]
+
+    # Ring settings which keep the turnovers and double steps within the message
+    def get_position(slot, ring_setting):
+        return (offsets[slot] + ring_setting - 1) % 26
+
+    first_turnover = get_first_turnover(first[0], notches[0])
+    right_ring_settings = [ring_settings[0]]
+    if first_turnover > length:
+        right_ring_settings = [candidate for candidate in range(1, 27) if get_first_turnover(get_position(0, candidate), notches[0]) > length]
+
+    for right_ring_setting in right_ring_settings:
+        turnover = get_first_turnover(get_position(0, right_ring_setting), notches[0])
+        middle_ring_settings = [ring_settings[1]]
+        if get_first_double_step(first[1], notches[1], first_turnover) > length:
+            middle_ring_settings = [candidate for candidate in range(1, 27) if get_first_double_step(get_position(1, candidate), notches[1], turnover) > length]
+
+        for middle_ring_setting in middle_ring_settings:
+            canonical_ring_settings = [right_ring_setting, middle_ring_setting, 1]
+            predecessor = get_predecessor([get_position(slot, canonical_ring_settings[slot]) for slot in range(3)], notches)
+            if predecessor is not None:
+                return (predecessor, canonical_ring_settings)
+
+    # The configuration itself always qualifies; this is never reached
+    return (positions, ring_settings)
+
+# Lowest right ring setting shift (1 to 25) which canonicalize_stepping_rotors would try before the ring
+# settings themselves and settle on, given the positions after the first key press; 26 when there is none
+def get_right_ring_limit(first, notches, length):
+    first_turnover = get_first_turnover(first[0], notches[0])
+    if first_turnover <= length:
+        return 26
+
+    for shift in range(1, 26):
+        right = (first[0] - shift) % 26
+        turnover = get_first_turnover(right, notches[0])
+        if turnover <= length:
+            continue
+
+        if get_first_double_step(first[1], notches[1], first_turnover) <= length:
+            middles = [first[1]]
+        else:
+            middles = [middle for middle in range(26) if get_first_double_step(middle, notches[1], turnover) > length]
+
+        if any(get_predecessor([right, middle, first[2]], notches) is not None for middle in middles):
+            return shift
+
+    return 26
+
+# Lowest middle ring setting shift (1 to 25) which canonicalize_stepping_rotors would settle on before the
+# middle ring setting itself, given the positions after the first key press; 26 when there is none
+def get_middle_ring_limit(first, notches, length):
+    first_turnover = get_first_turnover(first[0], notches[0])
+    if get_first_double_step(first[1], notches[1], first_turnover) <= length:
+        return 26
+
+    for shift in range(1, 26):
+        middle = (first[1] - shift) % 26
+        if get_first_double_step(middle, notches[1], first_turnover) > length and get_predecessor([first[0], middle, first[2]], notches) is not None:
+            return shift
+
+    return 26
+
+"""
+    Canonical ring settings of the stepping rotors for every start position, for messages of a length
+    A key with ring settings (right, middle, 1) is canonical exactly when its start positions are the
+    ones canonicalize_stepping_rotors picks for the positions after the first key press and neither
+    ring setting is above its limit; every lower ring setting is one the canonical form would try first
+    :param notches: Zero based notches of the stepping rotors, in slots order (rightmost first)
+    :param length: Number of key presses of the messages (None for messages of any length)
+    :returns: List indexed by get_offsets_index of the start positions, of (right limit, middle limit) or
+        None for start positions which are never canonical
+"""
+def get_canonical_ring_limits(notches, length = None):
+    notches = tuple(notches[:3])
+    length = NEVER if length is None else length
+
+    if (notches, length) not in CANONICAL_RING_LIMITS_CACHE:
+        limits = [None] * OFFSET_COMBINATIONS
+        for number in range(OFFSET_COMBINATIONS):
+            positions = [number % 26, number // 26 % 26, number // 676]
+            first = step(positions, notches)
+            if get_predecessor(first, notches) == positions:
+                limits[number] = (get_right_ring_limit(first, notches, length), get_middle_ring_limit(first, notches, length))
+
+        CANONICAL_RING_LIMITS_CACHE[(notches, length)] = limits
+
+    return CANONICAL_RING_LIMITS_CACHE[(notches, length)]
+
+# Position (zero based) which keeps a rotor's offset when its ring setting changes
+def shift_position(position, ring_setting, new_ring_setting):
+    return (position + new_ring_setting - ring_setting) % 26
+
+"""
+    Maps a configuration to the canonical one of the configurations which encode the same way
+    The encoding only depends on each rotor's offset (position minus ring setting) at each key
+    press. Two configurations encode the same way when their offsets after the first key press
+    are the same and so are the key presses on which the middle and left rotors step afterwards:
+    - Rotors left of the middle one never turn another rotor over: their ring setting is always 1
+    - With a message length, the right rotor's ring setting is free while its first turnover falls
+      after the message, and the middle rotor's while its first double step does
+    - Any stepping of the middle and left rotors on the first key press is moved into their start
+      positions
+    The lowest free ring settings are kept. Plug leads are sorted, and static rotors folding into
+    a known reflector are removed.
+
+    :param length: Number of key presses of the messages (None for messages of any length)
+    :returns: configuration.KeyConfiguration
+"""
+def canonicalize(configuration, length = None):
+    configuration = fold_static_rotors(create_configuration(*configuration))
+    (rotors, reflector, ring_settings, positions, plug_leads) = configuration
+
+    # Slots order (rightmost rotor first)
+    ring_settings = list(ring_settings[::-1])
+    positions = to_indices(positions[::-1])
+    notches = [get_rotor_spec(label)[2] for label in rotors[::-1]]
+
+    for slot in range(3, len(rotors)):
+        positions[slot] = shift_position(positions[slot], ring_settings[slot], 1)
+        ring_settings[slot] = 1
+
+    if len(rotors) >= 3:
+        (positions[:3], ring_settings[:3]) = canonicalize_stepping_rotors(positions[:3], ring_settings[:3], notches[:3], NEVER if length is None else length)
+
+    plug_leads = sorted([''.join(sorted(plug_lead.upper())) for plug_lead in plug_leads])
+
+    return create_configuration(rotors, reflector, ring_settings[::-1], [ALPHABET[position] for position in positions[::-1]], plug_leads)
+
+# Identifies if a configuration is the canonical one of its equivalent configurations
+def is_canonical(configuration, length = None):
+    configuration = create_configuration(*configuration)
+
+    return canonicalize(configuration, length) == configuration
+
+# Replaces the static rotors (left of the three stepping ones) and the reflector by a known reflector
+# they are equivalent to, if any; the configuration is returned unchanged otherwise
+def fold_static_rotors(configuration):
+    static_count = len(configuration.rotors) - 3
+    if static_count < 1:
+        return configuration
+
+    static_offsets = [
+        (position - ring_setting + 1) % 26
+        for position, ring_setting in zip(to_indices(configuration.positions[:static_count]), configuration.ring_settings[:static_count])
+    ]
+    reflector = get_reflector_label(get_effective_reflector(configuration.reflector, configuration.rotors[:static_count], static_offsets))
+    if reflector is None:
+        return configuration
+
+    return configuration._replace(
+        rotors=configuration.rotors[static_count:],
+        reflector=reflector,
+        ring_settings=configuration.ring_settings[static_count:],
+        positions=configuration.positions[static_count:],
+    )
+
+# Identifies if plug leads are in their canonical (sorted) form
+def has_canonical_plug_leads(plug_leads):
+    return tuple(plug_leads) == tuple(sorted([''.join(sorted(plug_lead.upper())) for plug_lead in plug_leads]))
+
+"""
+    Iterates the canonical configurations of a search space, skipping every configuration
+    which encodes messages of the given length like another one
+    The canonical keys are enumerated directly: for each rotor order, reflector, plugboard and start
+    positions, only the ring settings within the canonical limits of those positions are produced (see
+    get_canonical_ring_limits), so the configurations come grouped by start positions
+    :param space: enigma_search.SearchSpace
+    :param length: Number of key presses of the messages (None for messages of any length)
+"""
+def iter_canonical_configurations(space, length = None):
+    for (rotors, reflector, plug_leads) in itertools.product(space.rotor_orders, space.reflectors, space.plug_leads):
+        if len(rotors) < 3:
+            for (ring_settings, positions) in itertools.product(itertools.product(*space.ring_settings), itertools.product(*space.positions)):
+                configuration = create_configuration(rotors, reflector, ring_settings, positions, plug_leads)
+                if is_canonical(configuration, length):
+                    yield configuration
+            continue
+
+        if not has_canonical_plug_leads(plug_leads):
+            continue
+
+        # The rotors left of the middle one always have ring setting 1
+        left_ring_settings = [[1] if 1 in choices else [] for choices in space.ring_settings[:-2]]
+        notches = [get_rotor_spec(label)[2] for label in rotors[:-4:-1]]
+        limits = get_canonical_ring_limits(notches, length)
+        static_count = len(rotors) - 3
+        folds_by_static_positions = {}
+
+        for positions in itertools.product(*space.positions):
+            (left, middle, right) = to_indices(positions[-3:])
+            limit = limits[get_offsets_index(right, middle, left)]
+            if limit is None:
+                continue
+
+            # Static rotors folding into a known reflector are canonical without them
+            static_positions = tuple(to_indices(positions[:static_count]))
+            if static_positions not in folds_by_static_positions:
+                folds_by_static_positions[static_positions] = static_count > 0 and get_reflector_label(get_effective_reflector(reflector, rotors[:static_count], static_positions)) is not None
+            if folds_by_static_positions[static_positions]:
+                continue
+
+            middle_ring_settings = [ring_setting for ring_setting in space.ring_settings[-2] if ring_setting <= limit[1]]
+            right_ring_settings = [ring_setting for ring_setting in space.ring_settings[-1] if ring_setting <= limit[0]]
+            for ring_settings in itertools.product(*left_ring_settings, middle_ring_settings, right_ring_settings):
+                yield create_configuration(rotors, reflector, ring_settings, positions, plug_leads)
+
+"""
+    Search space whose searches only try the canonical start positions of the stepping rotors: for
+    each task, the start positions whose ring settings are within their canonical limits for the
+    length the search covers. It only comes from reduce_search_space, which checks the space holds
+    the canonical key of every key it leaves out
+"""
+class CanonicalSearchSpace(SearchSpace):
+    def get_start_positions(self, task, length):
+        (rotors, _, ring_settings, _) = task
+        notches = [get_rotor_spec(label)[2] for label in rotors[:-4:-1]]
+        limits = get_canonical_ring_limits(notches, length)
+        (right_ring_setting, middle_ring_setting) = (ring_settings[-1], ring_settings[-2])
+
+        start_positions = []
+        for positions in super().get_start_positions(task, length):
+            limit = limits[get_offsets_index(*positions[:3])]
+            if limit is not None and right_ring_setting <= limit[0] and middle_ring_setting <= limit[1]:
+                start_positions.append(positions)
+
+        return start_positions
+
+"""
+    Narrows a search space to ring setting 1 for the rotors left of the middle one wherever their
+    positions cover the whole alphabet; every configuration left out has an equivalent one left in
+    When the positions of the three stepping rotors cover the whole alphabet and the right and middle
+    rotors every ring setting, the searches also skip the start positions which are not canonical for
+    the crib's length (see iter_canonical_configurations)
+    :returns: enigma_search.SearchSpace
+"""
+def reduce_search_space(space):
+    ring_settings = [list(choices) for choices in space.ring_settings]
+    for rotor in range(len(ring_settings) - 2):
+        if sorted(set([position.upper() for position in space.positions[rotor]])) == list(ALPHABET):
+            ring_settings[rotor] = [1]
+
+    covers_stepping_rotors = len(ring_settings) >= 3 and ring_settings[-3] == [1] and all(
+        sorted(set([position.upper() for position in space.positions[rotor]])) == list(ALPHABET) for rotor in range(-3, 0)
+    ) and all(sorted(set(ring_settings[rotor])) == list(range(1, 27)) for rotor in (-2, -1))
+
+    space_cls = CanonicalSearchSpace if covers_stepping_rotors else SearchSpace
+
+    return space_cls(space.rotor_orders, space.reflectors, space.positions, ring_settings, space.plug_leads)
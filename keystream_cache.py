@@ -0,0 +1,112 @@
+from collections import OrderedDict, namedtuple
+
+from configuration import create_configuration, create_machine
+
+# Default memory budget of a cache, in bytes of stored permutations
+DEFAULT_MAX_BYTES = 64 << 20
+
+# Default number of key presses stored per key; longer messages store as many as they need
+DEFAULT_LENGTH = 1024
+
+# Counters of a cache: lookups served from it, lookups which built an entry and entries evicted
+CacheStatistics = namedtuple('CacheStatistics', ['hits', 'misses', 'evictions', 'entries', 'size'])
+
+# Stored keystream of a key: its scrambler core and the plugboard it is conjugated with
+KeystreamEntry = namedtuple('KeystreamEntry', ['core', 'plugboard'])
+
+# Cache key of a configuration; plug leads are compared as a set of unordered letter pairs
+def get_cache_key(configuration):
+    configuration = create_configuration(*configuration)
+    plug_leads = tuple(sorted([''.join(sorted(plug_lead.upper())) for plug_lead in configuration.plug_leads]))
+
+    return configuration._replace(plug_leads=plug_leads)
+
+"""
+    Least recently used cache of the scrambler permutations of whole keys (E.g. a day's key)
+    Each entry stores the first key presses of a key as a enigma.ScramblerCore (26 bytes per key press)
+    with its plugboard, so encoding a message under a cached key is table lookups only.
+
+    Eviction policy: once the stored permutations go over max_bytes, the least recently used keys
+    are dropped until they fit. A key whose permutations alone are over max_bytes is never stored.
+
+    :param max_bytes: Memory budget for the stored permutations
+    :param length: Number of key presses stored per key (at least the message length)
+"""
+class KeystreamCache:
+    def __init__(self, max_bytes = DEFAULT_MAX_BYTES, length = DEFAULT_LENGTH):
+        if max_bytes < 0 or length < 0:
+            raise ValueError('The memory budget and the length must not be negative')
+
+        self.max_bytes = max_bytes
+        self.length = length
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, configuration):
+        return get_cache_key(configuration) in self.entries
+
+    # Gets the keystream entry of a configuration covering at least a number of key presses
+    def get(self, configuration, length = 0):
+        key = get_cache_key(configuration)
+        entry = self.entries.get(key)
+
+        if entry is not None and entry.core.length >= length:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        if entry is not None:
+            self.discard(key)
+
+        machine = create_machine(key)
+        entry = KeystreamEntry(machine.get_scrambler_core(max(self.length, length)), machine.plug_board)
+        self.store(key, entry)
+
+        return entry
+
+    # Stores an entry as the most recently used, then evicts until the cache fits its budget
+    def store(self, key, entry):
+        entry_size = len(entry.core.permutations)
+        if entry_size > self.max_bytes:
+            return
+
+        self.entries[key] = entry
+        self.size += entry_size
+
+        while self.size > self.max_bytes:
+            (_, evicted_entry) = self.entries.popitem(last=False)
+            self.size -= len(evicted_entry.core.permutations)
+            self.evictions += 1
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.core.permutations)
+
+    # Drops a configuration from the cache; returns whether it was cached
+    def evict(self, configuration):
+        key = get_cache_key(configuration)
+        cached = key in self.entries
+        self.discard(key)
+
+        return cached
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def statistics(self):
+        return CacheStatistics(self.hits, self.misses, self.evictions, len(self.entries), self.size)
+
+    # Encodes an upper case A to Z message from a configuration's start positions
+    def encode_text(self, configuration, text, engine = 'python'):
+        entry = self.get(configuration, len(text))
+
+        return entry.core.encode_text(text, entry.plugboard, engine)
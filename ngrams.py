@@ -0,0 +1,98 @@
+import array
+import math
+import sys
+
+from constants import ALPHABET
+
+# Header of the n-gram table files
+NGRAM_FILE_MAGIC = b'NGRM'
+
+# Count given to n-grams missing from the corpus, so they still get a (very low) log probability
+MISSING_NGRAM_COUNT = 0.01
+
+# Zero based indices of the letters in a text, skipping anything which is not a letter
+def get_letter_indices(text):
+    return [ord(character) - ord('A') for character in text.upper() if character in ALPHABET]
+
+"""
+    Log10 probabilities of every n-gram (bigram, trigram, quadgram, ...) of the 26 letters
+    Stored compactly as a flat array('f') of 26^n entries indexed by the n-gram's letters in base 26
+
+    :param n: Length of the n-grams
+    :param log_probabilities: array('f') of 26^n log10 probabilities
+"""
+class NgramTable:
+    def __init__(self, n, log_probabilities):
+        if len(log_probabilities) != 26 ** n:
+            raise ValueError(f'A table of {n}-grams needs {26 ** n} entries')
+
+        self.n = n
+        self.log_probabilities = log_probabilities
+
+    # Builds the table from the n-gram counts of a corpus text
+    @staticmethod
+    def from_corpus(text, n):
+        indices = get_letter_indices(text)
+        if len(indices) < n:
+            raise ValueError(f'The corpus needs at least {n} letters')
+
+        counts = [0] * (26 ** n)
+        for ngram_index in iter_ngram_indices(indices, n):
+            counts[ngram_index] += 1
+
+        total = len(indices) - n + 1
+        return NgramTable(n, array.array('f', [
+            math.log10((count or MISSING_NGRAM_COUNT) / total) for count in counts
+        ]))
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as file:
+            if file.read(len(NGRAM_FILE_MAGIC)) != NGRAM_FILE_MAGIC:
+                raise ValueError(f'{path} is not an n-gram table file')
+
+            n = file.read(1)[0]
+            log_probabilities = array.array('f')
+            log_probabilities.fromfile(file, 26 ** n)
+
+        # Files are little endian
+        if sys.byteorder == 'big':
+            log_probabilities.byteswap()
+
+        return NgramTable(n, log_probabilities)
+
+    def save(self, path):
+        log_probabilities = array.array('f', self.log_probabilities)
+        if sys.byteorder == 'big':
+            log_probabilities.byteswap()
+
+        with open(path, 'wb') as file:
+            file.write(NGRAM_FILE_MAGIC)
+            file.write(bytes([self.n]))
+            log_probabilities.tofile(file)
+
+    # Log probability of a text given as zero based indices
+    def score(self, indices):
+        log_probabilities = self.log_probabilities
+
+        return sum([log_probabilities[ngram_index] for ngram_index in iter_ngram_indices(indices, self.n)])
+
+# Index of every n-gram in a list of zero based letter indices, computed as a rolling base 26 number
+def iter_ngram_indices(indices, n):
+    modulus = 26 ** (n - 1)
+    ngram_index = 0
+    for position, index in enumerate(indices):
+        ngram_index = (ngram_index % modulus) * 26 + index
+        if position >= n - 1:
+            yield ngram_index
+
+# Index of coincidence of a text given as zero based indices (about 0.066 for English, 0.038 for random text)
+def index_of_coincidence(indices):
+    if len(indices) < 2:
+        return 0.0
+
+    counts = [0] * 26
+    for index in indices:
+        counts[index] += 1
+
+    return sum([count * (count - 1) for count in counts]) / (len(indices) * (len(indices) - 1))
@@ -0,0 +1,112 @@
+import collections
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Smallest chunk worth shipping to a worker process
+MIN_CHUNK_SIZE = 1 << 16
+
+# Number of chunks per worker; more chunks balance the load better
+CHUNKS_PER_WORKER = 4
+
+# Number of chunks per worker read ahead of the one being written out
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+# Line breaks, the only characters which are not key presses (see EnigmaMachine.encode_lines)
+LINE_BREAK_CHARACTERS = '\r\n'
+
+# Machine used by a worker process and the state chunks start from; set once per process by the pool initializer
+worker_machine = None
+worker_state = None
+
+# Pool initializer which hands the machine, at the positions the input starts from, to a worker process
+def init_worker(machine):
+    global worker_machine, worker_state
+    worker_machine = machine
+    worker_state = machine.snapshot()
+
+# Encodes a chunk of text starting a number of key presses after the start of the input
+def encode_chunk(key_presses, chunk, engine):
+    worker_machine.restore(worker_state)
+    worker_machine.advance(key_presses)
+
+    return worker_machine.encode_lines(chunk, engine)
+
+# Number of key presses a chunk of text takes: every character but the line breaks
+def count_key_presses(chunk):
+    return len(chunk) - sum(chunk.count(character) for character in LINE_BREAK_CHARACTERS)
+
+# Reads a chunk of a text file, which has to be ASCII so it can be split anywhere
+def read_chunk(file, path, chunk_size = -1):
+    chunk = file.read(chunk_size)
+    if not chunk.isascii():
+        raise ValueError(f'{path} is not an ASCII text file')
+
+    return chunk.decode('ascii')
+
+# Chunks of a text (str) or of the contents of a file (os.PathLike); a file is read a chunk at a time
+def iterate_chunks(text_or_path, chunk_size):
+    if not isinstance(text_or_path, os.PathLike):
+        for start in range(0, len(text_or_path), chunk_size):
+            yield text_or_path[start:start + chunk_size]
+        return
+
+    with open(text_or_path, 'rb') as file:
+        for chunk in iter(lambda: read_chunk(file, text_or_path, chunk_size), ''):
+            yield chunk
+
+# Encodes a text (str) or the contents of a file (os.PathLike) across a process pool
+# Every chunk is encoded from the machine's current positions plus the key presses before it, so the result and
+# the machine's final positions are identical to machine.encode_lines's; line breaks are kept and do not step the rotors
+# The encoded chunks are written to dst (a file object) in order as they complete, in which case the number of
+# characters written is returned, or are returned as a single text when dst is None
+# upper_case upper cases the input first, as the CLI does with the texts typed in
+def encode_parallel(machine, text_or_path, workers = None, chunk_size = None, engine = 'python', upper_case = False, dst = None):
+    length = os.path.getsize(text_or_path) if isinstance(text_or_path, os.PathLike) else len(text_or_path)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError('At least one worker is required')
+
+    if chunk_size is None:
+        chunk_size = max(MIN_CHUNK_SIZE, -(-length // (workers * CHUNKS_PER_WORKER)))
+    if chunk_size < 1:
+        raise ValueError('The chunk size must be positive')
+
+    output = io.StringIO() if dst is None else dst
+    characters_count = 0
+
+    # Not worth starting processes for a single chunk
+    if workers == 1 or length <= chunk_size:
+        for chunk in iterate_chunks(text_or_path, max(length, 1)):
+            encoded_chunk = machine.encode_lines(chunk.upper() if upper_case else chunk, engine)
+            output.write(encoded_chunk)
+            characters_count += len(encoded_chunk)
+
+        return output.getvalue() if dst is None else characters_count
+
+    # Chunks are read only as workers free up; each starts after the key presses counted in the chunks before it
+    key_presses = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(machine,)) as executor:
+        futures = collections.deque()
+        for chunk in iterate_chunks(text_or_path, chunk_size):
+            if upper_case:
+                chunk = chunk.upper()
+
+            if len(futures) == workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                encoded_chunk = futures.popleft().result()
+                output.write(encoded_chunk)
+                characters_count += len(encoded_chunk)
+
+            futures.append(executor.submit(encode_chunk, key_presses, chunk, engine))
+            key_presses += count_key_presses(chunk)
+
+        while futures:
+            encoded_chunk = futures.popleft().result()
+            output.write(encoded_chunk)
+            characters_count += len(encoded_chunk)
+
+    machine.advance(key_presses)
+
+    return output.getvalue() if dst is None else characters_count
@@ -0,0 +1,226 @@
+import math
+import os
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from constants import ALPHABET
+from enigma import PLUG_LEADS_LIMIT
+from enigma_search import get_plugboard_table, to_indices
+from scrambler import get_message_permutations
+
+# Best plugboard a restart of the climb ended with; plug_leads are E.g. ('AB', 'CD')
+PlugboardCandidate = namedtuple('PlugboardCandidate', ['score', 'plug_leads'])
+
+# Number of full passes over the letter pairs without improvement before a restart gives up
+MAX_STALE_PASSES = 2
+
+# N-gram tables used by a worker process; set once per process by the pool initializer
+worker_ngram_tables = None
+
+# Converts a plugboard permutation to its leads
+def get_plug_leads(plugboard):
+    return tuple([ALPHABET[letter] + ALPHABET[partner] for letter, partner in enumerate(plugboard) if letter < partner])
+
+def count_leads(plugboard):
+    return sum([1 for letter, partner in enumerate(plugboard) if letter < partner])
+
+"""
+    Hill climbing state for the plugboard of a message with fixed rotors
+    The scrambler permutation of every position is computed once, so a plugboard trial only
+    decrypts the positions whose letters it touches and re-scores the n-grams around them.
+
+    :param ciphertext: Ciphertext as zero based indices
+    :param permutations: Scrambler permutation at every position of the message
+    :param ngram_tables: ngrams.NgramTable objects whose scores are added up
+"""
+class PlugboardClimber:
+    def __init__(self, ciphertext, permutations, ngram_tables):
+        self.ciphertext = ciphertext
+        self.permutations = permutations
+        self.ngram_tables = [(table.n, table.log_probabilities) for table in ngram_tables]
+
+        # Positions by ciphertext letter, which never change
+        self.input_positions = [[] for _ in range(26)]
+        for position, index in enumerate(ciphertext):
+            self.input_positions[index].append(position)
+
+    # Starts the climb from a plugboard permutation
+    def reset(self, plugboard):
+        self.plugboard = list(plugboard)
+
+        # Scrambler outputs and plaintext per position, and positions by scrambler output letter
+        self.outputs = [permutation[self.plugboard[index]] for permutation, index in zip(self.permutations, self.ciphertext)]
+        self.plaintext = [self.plugboard[output] for output in self.outputs]
+        self.output_positions = [set() for _ in range(26)]
+        for position, output in enumerate(self.outputs):
+            self.output_positions[output].add(position)
+
+        self.score = self.score_windows(range(len(self.plaintext)), {})
+
+    # Sum of the n-gram scores of the windows starting at the given positions, with some letters overridden
+    def score_windows(self, positions, changed_letters):
+        plaintext = self.plaintext
+        length = len(plaintext)
+        score = 0.0
+
+        for (n, log_probabilities) in self.ngram_tables:
+            starts = set()
+            for position in positions:
+                starts.update(range(max(0, position - n + 1), min(position, length - n) + 1))
+
+            for start in starts:
+                ngram_index = 0
+                for position in range(start, start + n):
+                    ngram_index = ngram_index * 26 + changed_letters.get(position, plaintext[position])
+                score += log_probabilities[ngram_index]
+
+        return score
+
+    # Scores a plugboard which differs from the current one on some letters, without applying it
+    # Returns (score change, new plaintext letters by position, new scrambler outputs by position)
+    def try_plugboard(self, plugboard, letters):
+        positions = set()
+        for letter in letters:
+            positions.update(self.input_positions[letter])
+            positions.update(self.output_positions[letter])
+
+        outputs = {}
+        plaintext = {}
+        for position in positions:
+            output = self.permutations[position][plugboard[self.ciphertext[position]]]
+            letter = plugboard[output]
+            if output != self.outputs[position]:
+                outputs[position] = output
+            if letter != self.plaintext[position]:
+                plaintext[position] = letter
+
+        if len(plaintext) == 0:
+            return (0.0, plaintext, outputs)
+
+        delta = self.score_windows(plaintext, plaintext) - self.score_windows(plaintext, {})
+
+        return (delta, plaintext, outputs)
+
+    def apply(self, plugboard, delta, plaintext, outputs):
+        self.plugboard = plugboard
+        self.score += delta
+
+        for position, letter in plaintext.items():
+            self.plaintext[position] = letter
+        for position, output in outputs.items():
+            self.output_positions[self.outputs[position]].discard(position)
+            self.output_positions[output].add(position)
+            self.outputs[position] = output
+
+    # Plugboards one move away from the current one for a pair of letters, with the letters they change
+    def get_neighbours(self, first, second, max_leads):
+        plugboard = self.plugboard
+        first_partner = plugboard[first]
+        second_partner = plugboard[second]
+
+        # Remove the lead between the two letters
+        if first_partner == second:
+            neighbour = list(plugboard)
+            neighbour[first], neighbour[second] = first, second
+            yield (neighbour, (first, second))
+            return
+
+        # Connect the two letters, dropping their current leads
+        neighbour = list(plugboard)
+        for letter, partner in ((first, first_partner), (second, second_partner)):
+            neighbour[letter], neighbour[partner] = letter, partner
+        neighbour[first], neighbour[second] = second, first
+        changed = (first, second, first_partner, second_partner)
+        if count_leads(neighbour) <= max_leads:
+            yield (neighbour, changed)
+
+        # ... and also connect their former partners to each other
+        if first_partner != first and second_partner != second:
+            swapped = list(neighbour)
+            swapped[first_partner], swapped[second_partner] = second_partner, first_partner
+            yield (swapped, changed)
+
+    # Climbs until no move improves the score; with a temperature, worse moves are accepted at random (annealing)
+    def climb(self, max_leads = PLUG_LEADS_LIMIT, temperature = 0.0, cooling = 0.95, randomizer = None):
+        randomizer = randomizer or random.Random()
+        pairs = [(first, second) for first in range(26) for second in range(first + 1, 26)]
+        best = (self.score, list(self.plugboard))
+        stale_passes = 0
+
+        while stale_passes < MAX_STALE_PASSES:
+            improved = False
+            randomizer.shuffle(pairs)
+
+            for (first, second) in pairs:
+                for (neighbour, changed) in self.get_neighbours(first, second, max_leads):
+                    (delta, plaintext, outputs) = self.try_plugboard(neighbour, changed)
+
+                    if delta > 0 or (temperature > 0 and randomizer.random() < math.exp(delta / temperature)):
+                        self.apply(neighbour, delta, plaintext, outputs)
+                        if self.score > best[0] + 1e-9:
+                            best = (self.score, list(self.plugboard))
+                            improved = True
+                        break
+
+            temperature *= cooling
+            stale_passes = 0 if improved else stale_passes + 1
+
+        return PlugboardCandidate(best[0], get_plug_leads(best[1]))
+
+# Random plugboard permutation with a number of leads
+def get_random_plugboard(randomizer, leads):
+    letters = list(range(26))
+    randomizer.shuffle(letters)
+
+    plugboard = list(range(26))
+    for i in range(0, 2 * leads, 2):
+        plugboard[letters[i]], plugboard[letters[i + 1]] = letters[i + 1], letters[i]
+
+    return plugboard
+
+# Pool initializer which hands the n-gram tables to a worker process
+def init_worker(ngram_tables):
+    global worker_ngram_tables
+    worker_ngram_tables = ngram_tables
+
+# Runs one restart of the climb from a random plugboard, one stage per n-gram table
+def run_restart(seed, ciphertext, permutations, max_leads, temperature, ngram_tables = None):
+    randomizer = random.Random(seed)
+    plugboard = get_random_plugboard(randomizer, randomizer.randint(0, 2))
+
+    for ngram_table in ngram_tables or worker_ngram_tables:
+        climber = PlugboardClimber(ciphertext, permutations, [ngram_table])
+        climber.reset(plugboard)
+        candidate = climber.climb(max_leads, temperature, randomizer=randomizer)
+        plugboard = get_plugboard_table(candidate.plug_leads)
+
+    return candidate
+
+"""
+    Recovers the plugboard of a ciphertext from its rotor settings by n-gram hill climbing
+    :param rotors, ring_settings, positions: From left to right (E.g. ('I', 'II', 'III'), (1, 1, 1), 'ABC')
+    :param ngram_tables: ngrams.NgramTable objects climbed with in stages, in order; bigrams, trigrams then
+        quadgrams work best as the longer n-grams only help once most of the plugboard is right
+    :param restarts: Number of climbs from random plugboards; they run in parallel across workers
+    :param temperature: Starting temperature for simulated annealing (0 for pure hill climbing)
+    :returns: List of PlugboardCandidate (scored with the last table), best first
+"""
+def recover_plugboard(ciphertext, rotors, reflector, ring_settings, positions, ngram_tables, restarts = 8, max_leads = PLUG_LEADS_LIMIT, temperature = 0.0, seed = None, workers = None):
+    if len(ngram_tables) == 0:
+        raise ValueError('At least one n-gram table is needed to score the decrypts')
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    ciphertext = to_indices(ciphertext)
+    permutations = get_message_permutations(rotors, reflector, ring_settings, positions, len(ciphertext))
+    seeds = [random.Random(seed).getrandbits(64) + restart for restart in range(restarts)]
+
+    if workers == 1 or restarts == 1:
+        candidates = [run_restart(restart_seed, ciphertext, permutations, max_leads, temperature, ngram_tables) for restart_seed in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(ngram_tables,)) as executor:
+            futures = [executor.submit(run_restart, restart_seed, ciphertext, permutations, max_leads, temperature) for restart_seed in seeds]
+            candidates = [future.result() for future in futures]
+
+    return sorted(candidates, key=lambda candidate: -candidate.score)
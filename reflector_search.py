@@ -0,0 +1,146 @@
+import itertools
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from configuration import create_configuration, create_machine
+from enigma_search import to_indices
+from helpers import flatten_reflector_mapping_pairs, get_reflector_mapping_pairs
+from rotors import rotor_cls_from_name
+
+# Reflector found by the search; swapped_pairs are the rewired pairs (E.g. (('A', 'C'), ('B', 'D')))
+# and characters its full wiring, as taken by Rotor.override_characters
+RewiredReflector = namedtuple('RewiredReflector', ['reflector', 'swapped_pairs', 'characters'])
+
+# Number of tasks a worker process takes from the queue at once
+TASKS_CHUNK_SIZE = 16
+
+# Zero based letter pairs of a reflector label, from helpers.get_reflector_mapping_pairs
+def get_reflector_pairs(label):
+    characters = list(rotor_cls_from_name(label)().characters)
+
+    return [tuple(sorted(to_indices(pair))) for pair in get_reflector_mapping_pairs(characters)]
+
+# Every way of grouping an even number of items into unordered couples, each grouping once
+def iter_couplings(items):
+    if len(items) == 0:
+        yield []
+        return
+
+    first = items[0]
+    for i in range(1, len(items)):
+        for coupling in iter_couplings(items[1:i] + items[i + 1:]):
+            yield [(first, items[i])] + coupling
+
+# Pairs which connect two reflector pairs the other way round; choice picks one of the two ways
+def swap_pairs(first_pair, second_pair, choice):
+    ((a, b), (c, d)) = (first_pair, second_pair)
+
+    return [(a, c), (b, d)] if choice == 0 else [(a, d), (b, c)]
+
+"""
+    Letter pairs the reflector must connect for the crib to decrypt, one per crib letter
+    The plugboard and rotors are known, so for each key press the current can be followed from
+    both the ciphertext and crib letters up to the reflector; as the path back out is the inverse
+    of the path in, the reflector must connect the two letters reached.
+
+    :returns: List of (letter, letter) zero based index pairs, or None when a pair is impossible
+"""
+def get_crib_constraints(ciphertext, crib, configuration, crib_offset = 0):
+    machine = create_machine(configuration)
+    machine.seek(crib_offset)
+    plugboard_table = machine.get_plugboard_table() or list(range(26))
+
+    constraints = set()
+    for ciphertext_index, crib_index in zip(to_indices(ciphertext[crib_offset:crib_offset + len(crib)]), to_indices(crib)):
+        machine.perform_rotations()
+
+        (first, second) = (plugboard_table[ciphertext_index], plugboard_table[crib_index])
+        for rotor in machine.rotors:
+            (first, second) = (rotor.encode_forward(first), rotor.encode_forward(second))
+
+        # A reflector never connects a letter to itself
+        if first == second:
+            return None
+
+        constraints.add((min(first, second), max(first, second)))
+
+    return sorted(constraints)
+
+# Checks every rewiring of one set of reflector pairs against the crib constraints
+def search_task(task, constraints):
+    (label, base_pairs, chosen) = task
+
+    # Letters of the pairs left alone keep their partners; one broken constraint rules out the whole task
+    base_table = [0] * 26
+    for (a, b) in base_pairs:
+        base_table[a], base_table[b] = b, a
+
+    chosen_letters = set([letter for pair_index in chosen for letter in base_pairs[pair_index]])
+    open_constraints = []
+    for (a, b) in constraints:
+        if a in chosen_letters or b in chosen_letters:
+            open_constraints.append((a, b))
+        elif base_table[a] != b:
+            return []
+
+    # Cheap rejection: a constraint can only hold when both its letters are rewired
+    if any((a in chosen_letters) != (b in chosen_letters) for (a, b) in open_constraints):
+        return []
+
+    found = []
+    for coupling in iter_couplings([base_pairs[pair_index] for pair_index in chosen]):
+        for choices in itertools.product((0, 1), repeat=len(coupling)):
+            table = list(base_table)
+            swapped = []
+            for (first_pair, second_pair), choice in zip(coupling, choices):
+                for (a, b) in swap_pairs(first_pair, second_pair, choice):
+                    table[a], table[b] = b, a
+                    swapped.append((a, b))
+
+            if all(table[a] == b for (a, b) in open_constraints):
+                letter_pairs = [(chr(ord('A') + a), chr(ord('A') + b)) for (a, b) in swapped]
+                untouched = [(chr(ord('A') + a), chr(ord('A') + b)) for index, (a, b) in enumerate(base_pairs) if index not in chosen]
+                found.append(RewiredReflector(label, tuple(letter_pairs), flatten_reflector_mapping_pairs(untouched + letter_pairs)))
+
+    return found
+
+"""
+    Finds the reflectors, rewired from a known one by swapping wires between pairs, which decrypt
+    the ciphertext to the crib under a known key
+    A swap takes two of the reflector's pairs (a, b) and (c, d) and connects them either as (a, c)
+    and (b, d) or as (a, d) and (b, c). Each rewiring is enumerated once: swaps are unordered, and
+    never share a pair. Candidates are 26 entry permutations checked against one pair constraint
+    per crib letter, and the sets of pairs to rewire are spread across a process pool.
+
+    :param configuration: configuration.KeyConfiguration of every other part of the key
+    :param swaps: Number of swaps (k)
+    :param reflectors: Labels of the reflectors to rewire (the configuration's one by default)
+    :param workers: Number of worker processes (defaults to the number of CPUs)
+    :returns: List of RewiredReflector
+"""
+def search_rewired_reflectors(ciphertext, crib, configuration, swaps, crib_offset = 0, reflectors = None, workers = None):
+    if len(crib) == 0 or crib_offset < 0 or crib_offset + len(crib) > len(ciphertext):
+        raise ValueError('The crib must be placed within the ciphertext')
+    if swaps < 0 or 2 * swaps > 13:
+        raise ValueError('A reflector has 13 pairs, so between 0 and 6 swaps can be made')
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    configuration = create_configuration(*configuration)
+    constraints = get_crib_constraints(ciphertext, crib, configuration, crib_offset)
+    if constraints is None:
+        return []
+
+    tasks = []
+    for label in (reflectors or [configuration.reflector]):
+        base_pairs = get_reflector_pairs(label)
+        tasks.extend([(label, base_pairs, chosen) for chosen in itertools.combinations(range(len(base_pairs)), 2 * swaps)])
+
+    if workers == 1:
+        results = [search_task(task, constraints) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(search_task, tasks, itertools.repeat(constraints), chunksize=TASKS_CHUNK_SIZE))
+
+    return [candidate for candidates in results for candidate in candidates]
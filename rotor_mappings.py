@@ -287,3 +287,61 @@ CRotorMapping = [
     'H',
     'L',
 ]
+
+BThinRotorMapping = [
+    'E',
+    'N',
+    'K',
+    'Q',
+    'A',
+    'U',
+    'Y',
+    'W',
+    'J',
+    'I',
+    'C',
+    'O',
+    'P',
+    'B',
+    'L',
+    'M',
+    'D',
+    'X',
+    'Z',
+    'V',
+    'F',
+    'T',
+    'H',
+    'R',
+    'G',
+    'S',
+]
+
+CThinRotorMapping = [
+    'R',
+    'D',
+    'O',
+    'B',
+    'J',
+    'N',
+    'T',
+    'K',
+    'V',
+    'E',
+    'H',
+    'M',
+    'L',
+    'F',
+    'C',
+    'W',
+    'Z',
+    'A',
+    'X',
+    'G',
+    'Y',
+    'I',
+    'P',
+    'S',
+    'U',
+    'Q',
+]
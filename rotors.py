@@ -4,22 +4,145 @@ from constants import CurrentFlowDirections, RotorDirections
 from helpers import *
 from rotor_mappings import *
 
+# Interned wirings, keyed by their characters
+WIRINGS_CACHE = {}
+
+# Identity permutation of the 26 zero based indices
+IDENTITY_PERMUTATION = bytes(range(26))
+
+# Tail of a bytes.translate table for the bytes outside the 26 indices
+TRANSLATION_TABLE_TAIL = bytes(range(26, 256))
+
+"""
+    Immutable wiring of a rotor or reflector, shared by every rotor with the same characters
+    Tables are bytes of zero based indices; the offset tables are indexed by [offset][index]
+    where the offset is the distance between the rotor position and the ring setting; the translation
+    tables are the same tables padded to 256 entries for bytes.translate
+"""
+class Wiring:
+    __slots__ = ('characters', 'forward', 'inverse', 'forward_tables', 'reverse_tables', 'forward_translation_tables', 'reverse_translation_tables')
+
+    def __init__(self, characters):
+        forward = [ord(character.upper()) - ord('A') for character in characters]
+        if sorted(forward) != list(range(26)):
+            raise ValueError('The rotor characters must contain every letter between A and Z once')
+
+        inverse = [0] * 26
+        for index, mapped_index in enumerate(forward):
+            inverse[mapped_index] = index
+
+        set_attribute = object.__setattr__
+        set_attribute(self, 'characters', characters)
+        set_attribute(self, 'forward', bytes(forward))
+        set_attribute(self, 'inverse', bytes(inverse))
+        set_attribute(self, 'forward_tables', tuple(
+            bytes((forward[(index + offset) % 26] - offset) % 26 for index in range(26))
+            for offset in range(26)
+        ))
+        set_attribute(self, 'reverse_tables', tuple(
+            bytes((inverse[(index + offset) % 26] - offset) % 26 for index in range(26))
+            for offset in range(26)
+        ))
+        set_attribute(self, 'forward_translation_tables', tuple(table + TRANSLATION_TABLE_TAIL for table in self.forward_tables))
+        set_attribute(self, 'reverse_translation_tables', tuple(table + TRANSLATION_TABLE_TAIL for table in self.reverse_tables))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Wirings are immutable')
+
+    # Unpickles to the interned wiring of the receiving process
+    def __reduce__(self):
+        return (get_wiring, (self.characters,))
+
+# Gets the interned wiring for a set of characters
+def get_wiring(characters):
+    key = tuple(characters)
+    if key not in WIRINGS_CACHE:
+        WIRINGS_CACHE[key] = Wiring(characters)
+
+    return WIRINGS_CACHE[key]
+
+# Permutation of the current flowing through wirings at their offsets (outermost first), the reflector's
+# translation table (or None) and back through the wirings, composed with bytes.translate
+def compose_wirings(wirings, offsets, reflector_translation_table = None):
+    permutation = IDENTITY_PERMUTATION
+    for wiring, offset in zip(wirings, offsets):
+        permutation = permutation.translate(wiring.forward_translation_tables[offset])
+
+    if reflector_translation_table is not None:
+        permutation = permutation.translate(reflector_translation_table)
+
+    for wiring, offset in zip(reversed(wirings), reversed(offsets)):
+        permutation = permutation.translate(wiring.reverse_translation_tables[offset])
+
+    return permutation
+
+# Translation table of a reflector's translation table wrapped in the wirings of the rotors which never step (the
+# fourth slot and up, E.g. the Greek rotor of an M4) at their offsets, in slots order; the reflector's own without any
+def get_effective_reflector_table(static_wirings, static_offsets, reflector_translation_table):
+    if len(static_wirings) == 0:
+        return reflector_translation_table
+
+    return compose_wirings(static_wirings, static_offsets, reflector_translation_table) + TRANSLATION_TABLE_TAIL
+
+# Scrambler permutations for every offsets of the three stepping wirings (slots order, rightmost first) around a
+# reflector translation table, indexed by right offset + 26 * middle offset + 676 * left offset
+def compose_stepping_wirings(wirings, reflector_translation_table):
+    (right, middle, left) = wirings
+
+    permutations = []
+    for left_offset in range(26):
+        for middle_offset in range(26):
+            inner = compose_wirings((middle, left), (middle_offset, left_offset), reflector_translation_table) + TRANSLATION_TABLE_TAIL
+            for right_offset in range(26):
+                permutations.append(right.forward_tables[right_offset].translate(inner).translate(right.reverse_translation_tables[right_offset]))
+
+    return permutations
+
 """
     :param label: The label indicating the specs of this rotor
     :type label: string
 """
 class Rotor(ABC):
+    __slots__ = (
+        'label',
+        'wiring',
+        'notch_character',
+        'position_in_slots',
+        'initial_position',
+        'current_position',
+        'ring_setting',
+    )
+
     def __init__(self, **kwargs):
         self.label = ''
 
-        # Characters as they map to the 26 letter English alphabet
-        self.characters = []
+        # Shared wiring for the characters as they map to the 26 letter English alphabet
+        self.wiring = None
 
         # Character on which the notch is hit
         self.notch_character = None
 
         self.__set_state(**kwargs)
 
+    @property
+    # Characters as they map to the 26 letter English alphabet
+    def characters(self):
+        return [] if self.wiring is None else self.wiring.characters
+
+    @characters.setter
+    def characters(self, characters):
+        self.wiring = None if len(characters) == 0 else get_wiring(characters)
+
+    @property
+    # Forward lookup tables indexed by [rotor offset][character index]
+    def forward_tables(self):
+        return self.wiring.forward_tables
+
+    @property
+    # Reverse lookup tables indexed by [rotor offset][character index]
+    def reverse_tables(self):
+        return self.wiring.reverse_tables
+
     # Forces an overide of the initial character set for the rotor
     def override_characters(self, new_characters):
         self.characters = new_characters
@@ -59,7 +182,7 @@ class Rotor(ABC):
 
     # Gets the index for a character in the rotors alphabet mapping
     def get_mapping_index(self, character):
-        return self.characters.index(character)
+        return self.wiring.inverse[self.get_alphabet_index(character)]
 
     @staticmethod
     # Positions may grow out of the 1 to 26 boundary; this normalizes them
@@ -111,34 +234,35 @@ class Rotor(ABC):
 
         self.current_position = new_position
 
+    # Converts a zero based character index across the rotor in the forward direction
+    def encode_forward(self, index):
+        return self.wiring.forward_tables[(self.current_position - self.ring_setting) % 26][index]
+
+    # Converts a zero based character index across the rotor in the reverse direction
+    def encode_reverse(self, index):
+        return self.wiring.reverse_tables[(self.current_position - self.ring_setting) % 26][index]
+
     # Converts a character across a rotor in either direction
     def handle_key_encoding(self, character, direction = CurrentFlowDirections.FORWARD):
-        rotor_offset = self.current_position - get_position_for_character('A')
+        index = get_index_for_character(character)
 
         if (direction == CurrentFlowDirections.FORWARD):
-            matching_rotor_pin_position = get_position_for_character(character) + rotor_offset - self.ring_setting_offset
-            matching_rotor_pin = self.normalize_character_position(matching_rotor_pin_position)
-            matching_rotor_character = get_character_for_position(matching_rotor_pin)
-
-            encoded_character = self.encode_right_to_left(matching_rotor_character)
-
-            matching_rotor_contact_position = get_position_for_character(encoded_character) - rotor_offset + self.ring_setting_offset
-            matching_rotor_contact = self.normalize_character_position(matching_rotor_contact_position)
-            encoded_character = get_character_for_position(matching_rotor_contact)
-
-            return encoded_character
+            encoded_index = self.encode_forward(index)
         else:
-            matching_rotor_contact_position = get_position_for_character(character) + rotor_offset - self.ring_setting_offset
-            matching_rotor_contact = self.normalize_character_position(matching_rotor_contact_position)
-            matching_rotor_character = get_character_for_position(matching_rotor_contact)
+            encoded_index = self.encode_reverse(index)
 
-            encoded_character = self.encode_left_to_right(matching_rotor_character)
+        return get_character_for_index(encoded_index)
 
-            matching_rotor_pin_position = get_position_for_character(encoded_character) - rotor_offset + self.ring_setting_offset
-            matching_rotor_pin = self.normalize_character_position(matching_rotor_pin_position)
-            encoded_character = get_character_for_position(matching_rotor_pin)
+    # Zero based index a character outside A to Z enters the rotor as: the position arithmetic wraps it once around
+    # the alphabet and the characters are indexed from their end for negative indices, which lands it on a letter
+    def get_entry_index(self, character):
+        rotor_offset = self.current_position - 1
+        pin = self.normalize_character_position(get_position_for_character(character) + rotor_offset - self.ring_setting_offset)
+        wiring_index = self.get_alphabet_index(get_character_for_position(pin))
+        if wiring_index < -26 or wiring_index > 25:
+            raise ValueError(f'The character {character!r} cannot be encoded')
 
-            return encoded_character
+        return (wiring_index - rotor_offset + self.ring_setting_offset) % 26
 
     # Forward direction encoding
     def encode_right_to_left(self, character):
@@ -153,18 +277,24 @@ class Rotor(ABC):
         return chr(character_index + ord('A'))
 
 class BetaRotor(Rotor):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.label = 'Beta'
         self.characters = BetaRotorMapping
 
 class GammaRotor(Rotor):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.label = 'Gamma'
         self.characters = GammaRotorMapping
 
 class IRotor(Rotor):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.label = 'I'
@@ -172,6 +302,8 @@ class IRotor(Rotor):
         self.notch_character = 'Q'
 
 class IIRotor(Rotor):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.label = 'II'
@@ -179,6 +311,8 @@ class IIRotor(Rotor):
         self.notch_character = 'E'
 
 class IIIRotor(Rotor):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.label = 'III'
@@ -186,6 +320,8 @@ class IIIRotor(Rotor):
         self.notch_character = 'V'
 
 class IVRotor(Rotor):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.label = 'IV'
@@ -193,6 +329,8 @@ class IVRotor(Rotor):
         self.notch_character = 'J'
 
 class VRotor(Rotor):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.label = 'V'
@@ -200,52 +338,70 @@ class VRotor(Rotor):
         self.notch_character = 'Z'
 
 class ARotor(Rotor):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.label = 'A'
         self.characters = ARotorMapping
 
 class BRotor(Rotor):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.label = 'B'
         self.characters = BRotorMapping
 
 class CRotor(Rotor):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.label = 'C'
         self.characters = CRotorMapping
 
-def get_all_rotors():
-    return {
-        'Beta': BetaRotor,
-        'Gamma': GammaRotor,
-        'I': IRotor,
-        'II': IIRotor,
-        'III': IIIRotor,
-        'IV': IVRotor,
-        'V': VRotor,
-        'A': ARotor,
-        'B': BRotor,
-        'C': CRotor
-    }
+class BThinRotor(Rotor):
+    __slots__ = ()
 
-def rotor_from_name(name):
-    rotors_dict = get_all_rotors()
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.label = 'BThin'
+        self.characters = BThinRotorMapping
 
-    if name in rotors_dict:
-        cls = rotors_dict[name]
-    else:
-        raise ValueError('There is no Rotor for the specified name')
+class CThinRotor(Rotor):
+    __slots__ = ()
 
-    return cls()
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.label = 'CThin'
+        self.characters = CThinRotorMapping
+
+# Rotor classes by label
+ROTOR_CLASSES = {
+    'Beta': BetaRotor,
+    'Gamma': GammaRotor,
+    'I': IRotor,
+    'II': IIRotor,
+    'III': IIIRotor,
+    'IV': IVRotor,
+    'V': VRotor,
+    'A': ARotor,
+    'B': BRotor,
+    'C': CRotor,
+    'BThin': BThinRotor,
+    'CThin': CThinRotor
+}
 
-def rotor_cls_from_name(name):
-    rotors_dict = get_all_rotors()
+def get_all_rotors():
+    return dict(ROTOR_CLASSES)
 
-    if name in rotors_dict:
-        cls = rotors_dict[name]
+def rotor_from_name(name):
+    return rotor_cls_from_name(name)()
+
+def rotor_cls_from_name(name):
+    if name in ROTOR_CLASSES:
+        cls = ROTOR_CLASSES[name]
     else:
         raise ValueError('There is no Rotor for the specified name')
 
@@ -0,0 +1,145 @@
+from configuration import create_configuration, create_machine
+from enigma_search import get_rotor_spec, get_rotor_wiring, to_indices
+from rotors import TRANSLATION_TABLE_TAIL, compose_stepping_wirings, get_effective_reflector_table
+from stepping import get_positions_after_key_presses
+
+# Number of combinations of offsets of the three stepping rotors
+OFFSET_COMBINATIONS = 26 ** 3
+
+# Pads a 26 entry permutation to a 256 entry bytes.translate table
+def to_translation_table(permutation):
+    return bytes(permutation) + TRANSLATION_TABLE_TAIL
+
+# Index of the permutation for the offsets of the right, middle and left rotors
+def get_offsets_index(right_offset, middle_offset, left_offset):
+    return (left_offset * 26 + middle_offset) * 26 + right_offset
+
+# Permutation of the reflector with static rotors (the fourth slot and up) in front of it
+#   static_rotors: Labels from left to right, static_offsets: their offsets (position minus ring setting)
+def get_effective_reflector(reflector, static_rotors = (), static_offsets = ()):
+    static_wirings = [get_rotor_wiring(label) for label in static_rotors[::-1]]
+    reflector_translation_table = get_rotor_wiring(reflector).forward_translation_tables[0]
+
+    return get_effective_reflector_table(static_wirings, list(static_offsets)[::-1], reflector_translation_table)[:26]
+
+"""
+    Scrambler (rotors and reflector, no plugboard) permutations for every combination of offsets
+    of the three rightmost rotors; an offset is the rotor's position minus its ring setting
+    Rotors to the left of those three never step and are folded into the reflector
+
+    :param rotors: Rotor labels from left to right
+    :param reflector: Reflector label
+    :param static_offsets: Offsets of the rotors left of the three stepping ones, from left to right
+"""
+class ScramblerTable:
+    def __init__(self, rotors, reflector, static_offsets = ()):
+        if len(rotors) < 3 or len(static_offsets) != len(rotors) - 3:
+            raise ValueError('The scrambler needs three stepping rotors and an offset for every static rotor')
+
+        self.rotors = tuple(rotors)
+        self.reflector = reflector
+        self.static_offsets = tuple(static_offsets)
+        self.reflector_permutation = get_effective_reflector(reflector, self.rotors[:-3], self.static_offsets)
+
+        # Permutations as 26 byte strings, indexed by get_offsets_index
+        self.permutations = self.build_permutations()
+
+    def build_permutations(self):
+        wirings = [get_rotor_wiring(label) for label in self.rotors[:-4:-1]]
+
+        return compose_stepping_wirings(wirings, to_translation_table(self.reflector_permutation))
+
+    # Gets the permutation for the offsets of the right, middle and left rotors
+    def get_permutation(self, right_offset, middle_offset, left_offset):
+        return self.permutations[get_offsets_index(right_offset, middle_offset, left_offset)]
+
+# Scrambler permutation at each key press of a message, for a machine key without its plugboard
+#   rotors, ring_settings and positions go from left to right; key_presses is the keystroke offset of the message
+def get_message_permutations(rotors, reflector, ring_settings, positions, length, key_presses = 0):
+    machine = create_machine(create_configuration(rotors, reflector, ring_settings, list(positions)))
+    machine.advance(key_presses)
+    core = machine.get_scrambler_core(length)
+
+    return [core.get_permutation(key_press) for key_press in range(length)]
+
+"""
+    Scrambler permutations of every start position of the stepping rotors, as windows into one keystream
+    The three stepping rotors go through a single cycle of 26 * 25 * 26 states, so the permutations
+    of a message from any start position are a slice of the permutations along that cycle. The
+    cycle is walked once and each start position only looks up where its window begins.
+
+    Starting with both the right and middle rotors on their notches, the first key press leaves the
+    rotors in a state off the cycle (the middle rotor steps once for both reasons); those 26 start
+    positions get their own window after the cycle.
+
+    :param rotors, ring_settings: From left to right; the ring settings of static rotors are ignored, and the
+        three stepping rotors must have notches (the cycle above assumes every one of them turns over)
+    :param static_offsets: Offsets of the rotors left of the three stepping ones, from left to right
+    :param length: Number of key presses every window covers
+"""
+class PositionSweep:
+    def __init__(self, rotors, reflector, ring_settings, length, static_offsets = ()):
+        # Slots order for the three stepping rotors (rightmost first)
+        self.notches = [get_rotor_spec(label)[2] for label in rotors[:-4:-1]]
+        if None in self.notches:
+            raise ValueError('The three rightmost rotors of a sweep must have notches')
+
+        table = ScramblerTable(rotors, reflector, static_offsets)
+        self.length = length
+
+        ring_offsets = [ring_setting - 1 for ring_setting in ring_settings[:-4:-1]]
+
+        cycle = self.walk_cycle()
+        cycle_indices = [-1] * OFFSET_COMBINATIONS
+        for cycle_index, positions in enumerate(cycle):
+            cycle_indices[get_offsets_index(*positions)] = cycle_index
+
+        # Cycle states, wrapped around so a window can start anywhere on it
+        states = cycle + [cycle[index % len(cycle)] for index in range(max(0, length - 1))]
+
+        # Index in states of the first key press of every start position (numbered as get_offsets_index)
+        self.window_starts = []
+        for number in range(OFFSET_COMBINATIONS):
+            start_positions = (number % 26, number // 26 % 26, number // 676)
+            first = self.step(start_positions)
+            cycle_index = cycle_indices[get_offsets_index(*first)]
+
+            if cycle_index == -1:
+                cycle_index = cycle_indices[get_offsets_index(*self.step(first))]
+                self.window_starts.append(len(states))
+                states.extend([first] + [cycle[(cycle_index + index) % len(cycle)] for index in range(max(0, length - 1))])
+            else:
+                self.window_starts.append(cycle_index)
+
+        self.permutation_indices = [
+            get_offsets_index(*[(position - ring_offset) % 26 for position, ring_offset in zip(positions, ring_offsets)])
+            for positions in states
+        ]
+        self.permutations = [table.permutations[index] for index in self.permutation_indices]
+
+    # Zero based (right, middle, left) positions after one key press
+    def step(self, positions):
+        return tuple([position % 26 for position in get_positions_after_key_presses(positions, self.notches, 1)])
+
+    # States of the cycle the rotors enter after a key press, starting from the state after A A A
+    def walk_cycle(self):
+        first = self.step((0, 0, 0))
+        cycle = [first]
+        positions = self.step(first)
+        while positions != first:
+            cycle.append(positions)
+            positions = self.step(positions)
+
+        return cycle
+
+    # Index in permutations of the first key press from start positions given from left to right (E.g. 'ABC')
+    def get_window_start(self, positions):
+        (left, middle, right) = to_indices(positions[-3:])
+
+        return self.window_starts[get_offsets_index(right, middle, left)]
+
+    # Scrambler permutation at each key press of a message, from start positions given from left to right
+    def get_window(self, positions):
+        window_start = self.get_window_start(positions)
+
+        return self.permutations[window_start:window_start + self.length]
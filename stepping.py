@@ -0,0 +1,103 @@
+
+# Closed form of the rotor stepping performed by EnigmaMachine.perform_rotations
+#
+# Positions and notches are zero based indices (A is 0) given in slots order,
+# i.e. the rightmost rotor first; a notch of None means the rotor has no notch.
+# The positions and key press counts may be Python integers or NumPy integer arrays,
+# in which case every computation happens element wise (and broadcasts).
+
+# Gets the zero based notch index for a rotor (None when it has no notch)
+def get_notch_index(rotor):
+    if rotor.notch_character is None:
+        return None
+
+    return ord(rotor.notch_character) - ord('A')
+
+# Number of key presses, out of the given count, on which a rotor starting at position sits on its notch
+def count_notch_hits(position, notch, key_presses):
+    if notch is None:
+        return key_presses * 0
+
+    first_hit = (notch - position) % 26
+
+    return (key_presses + 25 - first_hit) // 26
+
+# Computes the (unnormalized) rotor positions after a number of key presses
+def get_positions_after_key_presses(positions, notches, key_presses):
+    result = [position + key_presses * 0 for position in positions]
+    if len(positions) == 0:
+        return result
+
+    # The rotor in the first slot always rotates
+    right, right_notch = positions[0], notches[0]
+    result[0] = right + key_presses
+
+    if len(positions) == 1:
+        return result
+
+    middle, middle_notch = positions[1], notches[1]
+    kicks = count_notch_hits(right, right_notch, key_presses)
+
+    # Without a notch the middle rotor only moves on turnover and never turns the left rotor over
+    if middle_notch is None:
+        result[1] = middle + kicks
+        return result
+
+    # A middle rotor starting on its notch double steps on the first key press, which
+    # absorbs a turnover signaled on that same key press
+    starts_on_notch = (middle == middle_notch) * (key_presses >= 1)
+    if right_notch is not None:
+        kicks = kicks - starts_on_notch * (right == right_notch)
+    middle = middle + starts_on_notch
+    double_steps = starts_on_notch
+
+    # Afterwards, the key press after every turnover that lands the middle rotor on its notch
+    # is a double step; from there 25 turnovers bring it back to the notch
+    kicks_to_notch = (middle_notch - middle - 1) % 26 + 1
+    notch_arrivals = (kicks >= kicks_to_notch) * (1 + (kicks - kicks_to_notch) // 25)
+
+    # The double step of an arrival on the very last key press has not happened yet
+    last_press_kicks = right_notch is not None and (right + key_presses - 1) % 26 == right_notch
+    pending = (notch_arrivals > 0) * ((kicks - kicks_to_notch) % 25 == 0) * last_press_kicks
+    double_steps = double_steps + notch_arrivals - pending
+
+    result[1] = middle + kicks + notch_arrivals - pending
+
+    if len(positions) > 2:
+        result[2] = positions[2] + double_steps
+
+    return result
+
+# Compares the closed form with the per key stepping of EnigmaMachine.perform_rotations on random
+# machines; covers rotors without notches, middle rotors starting on their notch and turnovers
+# arriving on the last key press (every key press count up to a full cycle is checked)
+def assert_stepping(machines = 60, key_presses = 700):
+    import random
+
+    from enigma import EnigmaMachine
+    from rotors import rotor_cls_from_name
+
+    labels = ['I', 'II', 'III', 'IV', 'V', 'Beta', 'Gamma']
+    for i in range(machines):
+        rotors = [rotor_cls_from_name(label)() for label in random.sample(labels, random.choice([3, 4]))]
+        for rotor in rotors:
+            rotor.set_initial_position(random.randint(1, 26))
+
+        # Every third machine starts with the middle rotor (and sometimes the right one) on its notch
+        (right, middle) = (rotors[-1], rotors[-2])
+        if i % 3 == 0 and middle.notch_character is not None:
+            middle.set_initial_position(middle.notch_character)
+            if i % 2 == 0 and right.notch_character is not None:
+                right.set_initial_position(right.notch_character)
+
+        machine = EnigmaMachine(rotors, rotor_cls_from_name('B')())
+        start_positions = [rotor.current_position - 1 for rotor in machine.rotors]
+        notches = [get_notch_index(rotor) for rotor in machine.rotors]
+
+        for count in range(key_presses + 1):
+            positions = [position % 26 for position in get_positions_after_key_presses(start_positions, notches, count)]
+            assert positions == [rotor.current_position - 1 for rotor in machine.rotors], ([rotor.label for rotor in rotors], start_positions, count)
+            machine.perform_rotations()
+
+if __name__ == "__main__":
+    assert_stepping()
@@ -0,0 +1,157 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from stepping import get_notch_index, get_positions_after_key_presses
+
+# NumPy copies of the rotor lookup tables, keyed by the tables they were built from
+TABLE_ARRAYS_CACHE = {}
+
+# Identifies if NumPy is installed and the vectorized engine can be used
+def is_numpy_available():
+    return np is not None
+
+# Identifies if a text can go through the vectorized engine (upper case A to Z only)
+def can_vectorize_text(text):
+    return text.isascii() and text.isalpha() and text.isupper()
+
+# Gets a (26 offsets x 26 characters) array for a rotor's lookup tables
+def get_table_array(tables):
+    if tables not in TABLE_ARRAYS_CACHE:
+        TABLE_ARRAYS_CACHE[tables] = np.frombuffer(b''.join(tables), dtype=np.uint8).reshape(26, 26)
+
+    return TABLE_ARRAYS_CACHE[tables]
+
+# Gets a 26 entry array of the plugboard mapping (or None for no plugboard)
+def get_plugboard_array(machine):
+    plugboard_table = machine.get_plugboard_table()
+    if plugboard_table is None:
+        return None
+
+    return np.array(plugboard_table, dtype=np.uint8)
+
+# Offsets (position minus ring setting) of the stepping rotors, in slots order, at each of the next key presses
+def get_key_press_offsets(machine, count):
+    rotors = machine.rotors
+    start_positions = [rotor.current_position - 1 for rotor in rotors]
+    notches = [get_notch_index(rotor) for rotor in rotors]
+
+    # Rotor positions for every key press, including the double step of the middle rotor
+    key_presses = np.arange(1, count + 1, dtype=np.int64)
+    positions = get_positions_after_key_presses(start_positions, notches, key_presses)
+
+    # Rotors left of the three stepping ones never move and are folded into the effective reflector
+    return [(rotor_positions + 1 - rotor.ring_setting) % 26 for rotor, rotor_positions in zip(rotors[:3], positions)]
+
+# Sends zero based indices (one per key press) through the stepping rotors at their offsets, the effective reflector and back
+def scramble_indices(machine, offsets, indices):
+    stepping_rotors = machine.rotors[:3]
+
+    # Current flow in the forward direction
+    for rotor, rotor_offsets in zip(stepping_rotors, offsets):
+        indices = get_table_array(rotor.forward_tables)[rotor_offsets, indices]
+
+    effective_reflector = machine.get_effective_reflector()
+    if effective_reflector is not None:
+        indices = np.frombuffer(effective_reflector, dtype=np.uint8, count=26)[indices]
+
+    # Current flow in the reverse direction
+    for rotor, rotor_offsets in zip(reversed(stepping_rotors), reversed(offsets)):
+        indices = get_table_array(rotor.reverse_tables)[rotor_offsets, indices]
+
+    return indices
+
+# Encodes an array of zero based character indices at once, leaving the machine's rotors as the per key path would
+def encode_indices(machine, indices):
+    offsets = get_key_press_offsets(machine, len(indices))
+    plugboard = get_plugboard_array(machine)
+
+    if plugboard is not None:
+        indices = plugboard[indices]
+
+    indices = scramble_indices(machine, offsets, indices)
+
+    if plugboard is not None:
+        indices = plugboard[indices]
+
+    # Leave the rotors where the last key press left them
+    machine.advance(len(indices))
+
+    return indices
+
+# Zero based indices the characters outside A to Z enter the first rotor as, at its offsets for their key
+# presses; the array form of Rotor.get_entry_index (only ASCII codes, whose upper case only moves a to z)
+def get_entry_indices(rotor, codes, rotor_offsets):
+    ring_setting_offset = rotor.ring_setting - 1
+    rotor_offsets = (rotor_offsets + ring_setting_offset) % 26 - ring_setting_offset
+
+    pins = codes - (ord('A') - 1) + rotor_offsets
+    pins = np.where(pins <= 0, pins + 26, np.where(pins > 26, pins - 26, pins))
+    characters = pins + (ord('A') - 1)
+    characters = np.where((characters >= ord('a')) & (characters <= ord('z')), characters - (ord('a') - ord('A')), characters)
+
+    return (characters - ord('A') - rotor_offsets, (characters - ord('A') < -26) | (characters - ord('A') > 25))
+
+# Encodes a whole (ASCII) text at once; every character is a key press as on the per key path: upper case letters
+# go through the plugboard both ways, lower case letters only on the way out, and anything else enters the first
+# rotor as a letter (see Rotor.get_entry_index)
+def encode_text(machine, text):
+    if len(text) == 0:
+        return ''
+
+    codes = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    if can_vectorize_text(text):
+        return (encode_indices(machine, codes - ord('A')) + ord('A')).astype(np.uint8).tobytes().decode('ascii')
+
+    codes = codes.astype(np.int64)
+    upper_case = (codes >= ord('A')) & (codes <= ord('Z'))
+    lower_case = (codes >= ord('a')) & (codes <= ord('z'))
+    others = ~(upper_case | lower_case)
+
+    offsets = get_key_press_offsets(machine, len(codes))
+    indices = np.where(lower_case, codes - ord('a'), codes - ord('A'))
+
+    # Checked before the rotors move, so a text which cannot be encoded leaves the machine as it was
+    (entry_indices, invalid) = get_entry_indices(machine.rotors[0], codes[others], offsets[0][others])
+    if invalid.any():
+        raise ValueError(f'The character {text[int(np.flatnonzero(others)[invalid.argmax()])]!r} cannot be encoded')
+    indices[others] = entry_indices % 26
+
+    plugboard = get_plugboard_array(machine)
+    if plugboard is not None:
+        indices = np.where(upper_case, plugboard[indices], indices)
+
+    indices = scramble_indices(machine, offsets, indices)
+
+    if plugboard is not None:
+        indices = plugboard[indices]
+
+    machine.advance(len(codes))
+
+    return (indices + ord('A')).astype(np.uint8).tobytes().decode('ascii')
+
+# Encodes ASCII A to Z bytes from a buffer straight into a writable buffer, without copying either
+def encode_into(machine, src, dst):
+    indices = np.frombuffer(src, dtype=np.uint8) - ord('A')
+    if len(indices) == 0:
+        return 0
+
+    # Bytes below 'A' wrap around to large values too
+    if indices.max() > 25:
+        raise ValueError('Only the bytes between A and Z can be encoded')
+
+    output = np.frombuffer(dst, dtype=np.uint8, count=len(indices))
+    output[:] = encode_indices(machine, indices) + ord('A')
+
+    return len(indices)
+
+# Encodes ASCII A to Z bytes (already through the plugboard) with the flat permutations of a scrambler core
+def encode_with_core(permutations, message):
+    if len(message) == 0:
+        return b''
+
+    indices = np.frombuffer(message, dtype=np.uint8) - ord('A')
+    rows = np.frombuffer(permutations, dtype=np.uint8).reshape(-1, 26)
+
+    return (rows[np.arange(len(indices)), indices] + ord('A')).astype(np.uint8).tobytes()